@@ -5,10 +5,10 @@ from chat_handler import send_message
 import ui
 import streamlit as st
 import streamlit as st
-from gdrive_utils import get_drive_service
 
 if "code" in st.query_params:
-    # This runs only on OAuth redirect
+    # This runs only on OAuth redirect; other storage backends never import the Drive client
+    from gdrive_utils import get_drive_service
     st.title("Connecting to Google Drive...")
     service = get_drive_service()
     st.success("✅ Google Drive connected successfully!")
@@ -18,6 +18,15 @@ if "code" in st.query_params:
 
 
 from ui import setup_ui, render_sidebar, render_chat, render_main_ui
+# Background ingestion workers live for the whole process, across reruns and sessions
+import ingest_jobs
+import delete_jobs
+from jobs import start_job_runner
+start_job_runner()
+delete_jobs.resume_failed_account_deletions()
+# Declared MongoDB indexes (unique username/email, chat pages, jobs); migrations run via the CLI
+from db_bootstrap import bootstrap_indexes
+bootstrap_indexes()
 print("[DEBUG] Starting app.py")
 from auth import require_login
 require_login()
@@ -42,17 +51,26 @@ if selected_pdf and username:
     if collection_name:
         print(f"[DEBUG] Using Qdrant collection for user: {collection_name}")
 
-        # Only try to load if vectordb not already set (upload already created it)
+        # Only try to load if vectordb not already set, and not while a background job is still indexing it
         if "vectordb" not in st.session_state or st.session_state.vectordb is None:
             from embeddings_utils import build_or_load_index
-            st.session_state.vectordb = build_or_load_index(collection_name=collection_name)
+            from ui import get_index_collection, get_pending_ingest_job
+            if get_pending_ingest_job(collection_name):
+                print(f"[DEBUG] Index for {collection_name} is still being built")
+                st.session_state.vectordb = None
+            else:
+                st.session_state.vectordb = build_or_load_index(collection_name=get_index_collection(collection_name))
 
         st.session_state.PDF_NAME = collection_name
 
         # Always rebuild retriever for selected collection
         if st.session_state.vectordb:
             print("[DEBUG] Creating retriever for selected PDF (user-specific)")
-            st.session_state.retriever = st.session_state.vectordb.as_retriever(search_kwargs={"k": 4})
+            from embeddings_utils import get_retriever
+            from ui import get_index_collection
+            st.session_state.retriever = get_retriever(st.session_state.vectordb, get_index_collection(collection_name))
+        else:
+            st.session_state.retriever = None
 
 else:
     # fallback: no PDF selected, load default if available
@@ -3,18 +3,11 @@
 import streamlit as st
 import os  # Only for non-file ops
 import base64
-from pymongo import MongoClient
 from ui import load_user_chats, save_user_chats
-from qdrant_client import QdrantClient
-from config import QDRANT_URL, QDRANT_API_KEY , MONGO_URI
-# gdrive_utils functions are imported defensively inside delete_account
+import db
+import write_behind
+from storage import get_storage
 
-
-# --- MongoDB Setup ---
-client = MongoClient(MONGO_URI)
-db = client["pdfbot"]
-users_col = db["users"]
-chats_col = db["users"]
 st.set_page_config(layout="wide")
 
 # --- Convert image to base64 ---
@@ -26,22 +19,22 @@ log_icon_base64 = img_to_base64("assets/LOGIN.png")
 welcome_icon_base64= img_to_base64("assets/MYLOGO.png")
 # --- MongoDB user DB helper functions ---
 def get_user_by_username_or_email(identifier):
-    return users_col.find_one({"$or": [{"username": identifier}, {"email": identifier}]})
+    return db.get_user_by_username_or_email(identifier)
 
 def get_user_by_username(username):
-    return users_col.find_one({"username": username})
+    return db.get_user(username)
 
 def user_exists_by_email(email):
-    return users_col.find_one({"email": email}) is not None
+    return db.get_user_by_email(email) is not None
 
 def user_exists_by_username(username):
-    return users_col.find_one({"username": username}) is not None
+    return db.get_user(username) is not None
 
 def create_user(username, password, email):
-    users_col.insert_one({"username": username, "password": password, "email": email})
+    db.insert_user(username, email, password)
 
 def delete_user(username):
-    users_col.delete_one({"username": username})
+    db.delete_user(username)
 
 # --- LOGIN INTERFACE ---
 def login_interface():
@@ -65,7 +58,12 @@ def login_interface():
 
         if st.button("Login", key="login_btn"):
                 user_doc = get_user_by_username_or_email(identifier)
-                if user_doc and user_doc.get("password") == password:
+                from delete_jobs import get_unfinished_account_deletion
+                if user_doc and user_doc.get("password") == password \
+                        and get_unfinished_account_deletion(user_doc["username"]):
+                    # The user document outlives the rest of the data until the job finishes
+                    st.warning("🧹 This account is being deleted. Please try again in a few minutes.")
+                elif user_doc and user_doc.get("password") == password:
                     st.session_state["authenticated"] = True
                     st.session_state["username"] = user_doc["username"]
                     st.session_state["persist_username"] = user_doc["username"] # Persist username for session
@@ -121,81 +119,23 @@ def create_account_interface():
 # --- DELETE ACCOUNT FUNCTION ---
 def delete_account(username):
 
-    """Deletes a user's entire account and all associated data."""
-    # Try to import Drive helpers; if unavailable, proceed without Drive steps
-    try:
-        from gdrive_utils import get_or_create_user_folder, list_user_files, delete_pdf_from_drive, get_drive_service
-        drive_helpers_available = True
-    except Exception:
-        drive_helpers_available = False
-
-    from qdrant_client import QdrantClient
-
-    st.info("🧹 Deleting all your data (MongoDB and Qdrant). Drive files will be removed if Drive is connected.")
-
+    """Queues deletion of a user's entire account and all associated data, and logs them out."""
     try:
         # --- Load user data from MongoDB ---
-        db = client["pdfbot"]
-        users_col = db["users"]  # ✅ This is the actual collection used in your app
-        user_data = users_col.find_one({"username": username})
+        user_data = db.get_user(username)
 
         if not user_data:
             st.warning("User not found in database.")
             return
 
-        user_collections = user_data.get("user_collections", [])
-        pdf_history = user_data.get("pdf_history", [])
-
-        # --- 1️⃣ Delete Qdrant Collections ---
-        try:
-            qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-            existing = [c.name for c in qdrant.get_collections().collections]
-            for collection in user_collections:
-                if collection in existing:
-                    qdrant.delete_collection(collection_name=collection)
-                    st.info(f"🧾 Deleted Qdrant collection: {collection}")
-        except Exception as qe:
-            st.warning(f"⚠️ Qdrant deletion error: {qe}")
-
-        # --- 2️⃣ Delete all PDFs from Google Drive (only if helpers available and user actually connected Drive) ---
-        try:
-            user_google_creds = user_data.get("google_creds") or user_data.get("google_oauth_data")
-            if drive_helpers_available and user_google_creds:
-                try:
-                    drive_service = get_drive_service()
-                    folder_id = get_or_create_user_folder(drive_service, username)
-                    user_files = list_user_files(drive_service, username)
-                    for f in user_files:
-                        try:
-                            delete_pdf_from_drive(drive_service, f['id'], username=username)
-                            st.info(f"🗑 Deleted Drive PDF: {f['name']}")
-                        except Exception as de:
-                            st.warning(f"⚠️ Failed to delete Drive file {f['name']}: {de}")
-
-                    # Delete the folder itself (best-effort)
-                    try:
-                        drive_service.files().delete(fileId=folder_id).execute()
-                        st.info(f"🗂 Deleted Drive folder for user: {username}")
-                    except Exception as fe:
-                        st.warning(f"⚠️ Could not delete Drive folder: {fe}")
-                except Exception as de_all:
-                    st.warning(f"⚠️ Drive deletion error: {de_all}")
-            else:
-                st.info("No Google Drive credentials found for this user or Drive helpers unavailable; skipping Drive deletion.")
-        except Exception as e:
-            st.warning(f"⚠️ Drive deletion unexpected error: {e}")
-
-        # --- 3️⃣ Delete from MongoDB ---
-        try:
-            delete_user(username)
-            chats_col.delete_one({"username": username})
-            st.info("✅ Removed user and chat data from MongoDB.")
-        except Exception as me:
-            st.warning(f"⚠️ MongoDB deletion error: {me}")
-
-        # --- 4️⃣ Clear session and confirm ---
+        # Qdrant indexes, stored PDFs and then the MongoDB records are deleted by a
+        # background job that survives restarts and resumes failed steps
+        from delete_jobs import submit_account_delete_job
+        submit_account_delete_job(username, user_data.get("user_collections", []))
+
+        # --- Clear session and confirm ---
         st.session_state.clear()
-        st.success("🗑 Account and all related data permanently deleted.")
+        st.toast("🗑 Your account and all related data are being deleted.", icon="✅")
         st.rerun()
 
     except Exception as e:
@@ -228,6 +168,8 @@ def require_login():
                 # Logout button
                 if st.button("🚪 Logout"):
                     save_user_chats()
+                    write_behind.flush(username)
+                    get_storage().release(username)
                     st.session_state.clear()
                     st.toast("You have been logged out.", icon="✅")
                     st.rerun()
@@ -250,7 +192,6 @@ def require_login():
                         label_visibility="collapsed"
                     )
                     if action == "✅ Yes, delete permanently":
-                     with st.spinner("🧹 Deleting your account and all data... please wait"):
                         delete_account(username)
                     elif action == "❌ Cancel":
                         st.session_state["confirm_delete"] = False
@@ -0,0 +1,133 @@
+# benchmark_profiles.py
+"""
+Compare collection profiles on real vectors: RAM against recall@k.
+
+    python benchmark_profiles.py <collection> [--sample 2000] [--queries 100] [--k 10]
+                                 [--profiles float32 int8 binary] [--apply PROFILE]
+
+Points sampled from <collection> are copied into one temporary collection per
+profile. Stored vectors serve as queries, and exact float32 search gives the
+ground truth. Temporary collections are dropped afterwards. RAM is measured from
+the segment sizes Qdrant reports in its telemetry once the collection is optimized
+("n/a" when telemetry is unavailable), next to the estimate from estimate_ram_bytes.
+--apply converts <collection> to a profile in place, without benchmarking.
+"""
+import json
+import time
+import random
+import argparse
+import urllib.request
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, SearchParams
+from config import QDRANT_URL, QDRANT_API_KEY
+from collection_profiles import PROFILES, get_profile, create_collection, apply_profile, search_params
+from collection_profiles import estimate_ram_bytes
+
+
+def sample_points(qdrant, collection_name, limit):
+    points, offset = [], None
+    while len(points) < limit:
+        page, offset = qdrant.scroll(collection_name, limit=min(256, limit - len(points)), offset=offset,
+                                     with_payload=False, with_vectors=True)
+        points.extend(page)
+        if offset is None:
+            break
+    return points
+
+
+def _wait_optimized(qdrant, collection_name, timeout=300):
+    """Wait until Qdrant has finished indexing/quantizing, so segment sizes are final."""
+    deadline = time.monotonic() + timeout
+    while qdrant.get_collection(collection_name).status != "green" and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+
+def measured_ram_bytes(collection_name):
+    """RAM Qdrant reports for the collection's local segments (telemetry), or None."""
+    request = urllib.request.Request(f"{QDRANT_URL.rstrip('/')}/telemetry?details_level=3")
+    if QDRANT_API_KEY:
+        request.add_header("api-key", QDRANT_API_KEY)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            telemetry = json.load(response)["result"]
+    except Exception as e:
+        print(f"[WARN] Telemetry unavailable: {e}")
+        return None
+    for collection in telemetry.get("collections", {}).get("collections", []):
+        if collection.get("id") == collection_name:
+            segments = [segment for shard in collection.get("shards", [])
+                        for segment in (shard.get("local") or {}).get("segments", [])]
+            if segments:
+                return sum(segment["info"]["ram_usage_bytes"] for segment in segments)
+    return None
+
+
+def _search(qdrant, collection_name, vector, k, params):
+    return [p.id for p in qdrant.query_points(collection_name, query=vector, limit=k,
+                                              search_params=params).points]
+
+
+def benchmark(qdrant, points, queries, k, profile_name):
+    profile = get_profile(profile_name)
+    name = f"bench__{profile_name}__{int(time.time())}"
+    dim = len(points[0].vector)
+    create_collection(qdrant, name, dim, profile)
+    try:
+        for i in range(0, len(points), 256):
+            qdrant.upsert(name, points=[PointStruct(id=p.id, vector=p.vector)
+                                        for p in points[i:i + 256]], wait=True)
+
+        _wait_optimized(qdrant, name)
+        ram_bytes = measured_ram_bytes(name)
+
+        exact = SearchParams(exact=True)
+        params = search_params(profile)
+        recall, elapsed = 0.0, 0.0
+        for query in queries:
+            truth = set(_search(qdrant, name, query.vector, k, exact))
+            started = time.perf_counter()
+            found = _search(qdrant, name, query.vector, k, params)
+            elapsed += time.perf_counter() - started
+            recall += len(truth.intersection(found)) / max(len(truth), 1)
+        return {
+            "profile": profile_name,
+            "ram_mb": ram_bytes / 2**20 if ram_bytes is not None else None,
+            "est_ram_mb": estimate_ram_bytes(len(points), dim, profile) / 2**20,
+            "recall": recall / len(queries),
+            "latency_ms": elapsed / len(queries) * 1000,
+        }
+    finally:
+        qdrant.delete_collection(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collection")
+    parser.add_argument("--sample", type=int, default=2000, help="points copied into each test collection")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--apply", choices=list(PROFILES), help="convert the collection to this profile and exit")
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    if args.apply:
+        apply_profile(qdrant, args.collection, get_profile(args.apply))
+        print(f"✅ '{args.collection}' switched to the {args.apply} profile (optimizing in the background)")
+        return
+
+    points = sample_points(qdrant, args.collection, args.sample)
+    if not points:
+        raise SystemExit(f"Collection '{args.collection}' has no points to benchmark.")
+    queries = random.sample(points, min(args.queries, len(points)))
+    print(f"📊 {len(points)} points, dim={len(points[0].vector)}, {len(queries)} queries, k={args.k}")
+    print(f"{'profile':<10}{'RAM (MB)':>10}{'estimated (MB)':>16}{'recall@k':>11}{'latency (ms)':>14}")
+    for profile_name in args.profiles:
+        row = benchmark(qdrant, points, queries, args.k, profile_name)
+        ram = f"{row['ram_mb']:.2f}" if row["ram_mb"] is not None else "n/a"
+        print(f"{row['profile']:<10}{ram:>10}{row['est_ram_mb']:>16.2f}{row['recall']:>11.3f}"
+              f"{row['latency_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# blob_cache.py
+import os
+import io
+import mmap
+import time
+import sqlite3
+import hashlib
+import threading
+from config import BLOB_CACHE_DIR, BLOB_CACHE_MAX_MB
+
+
+class BlobCache:
+    """
+    Local, content-addressed PDF store. Files live at <root>/<sha256[:2]>/<sha256>.pdf
+    and are written atomically (temp file + rename). A SQLite index tracks sizes and
+    last use for LRU eviction under max_bytes, plus aliases from a Drive file ID and
+    revision (md5Checksum) to the content hash, so a revised file never matches its
+    old revision. Reads are memory-mapped.
+    """
+
+    def __init__(self, root, max_bytes):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS aliases (file_id TEXT NOT NULL, revision TEXT NOT NULL, "
+            "digest TEXT NOT NULL, PRIMARY KEY (file_id, revision))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_used ON blobs(last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.pdf")
+
+    def lookup(self, file_id, revision):
+        """Content hash cached for this Drive file revision, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT a.digest FROM aliases a JOIN blobs b ON a.digest = b.digest "
+                "WHERE a.file_id = ? AND a.revision = ?", (file_id, revision)
+            ).fetchone()
+            if row and os.path.exists(self.path(row[0])):
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, data, file_id=None, revision=None):
+        """
+        Store bytes or a readable binary stream (copied in 1 MB blocks) and return its
+        SHA-256. Storing content that is already present only records the alias.
+        """
+        stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for block in iter(lambda: stream.read(1024 * 1024), b""):
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+            digest = digest.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            # Failed reads or writes must not leave orphaned temp files behind
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            self.total_bytes += size - (old[0] if old else 0)
+            self.conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, size, time.time()))
+            if file_id and revision:
+                self.conn.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)", (file_id, revision, digest))
+            self._evict(keep=digest)
+            self.conn.commit()
+        return digest
+
+    def open(self, digest):
+        """
+        Read-only memory map of a stored blob (pypdf reads it like a file; callers
+        slice it instead of loading the whole PDF). Returns None when missing.
+        """
+        try:
+            with open(self.path(digest), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self.lock:
+            self.conn.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest))
+            self.conn.commit()
+        return mapped
+
+    def _evict(self, keep=None):
+        """Delete least recently used blobs until the store is back under 90% of its budget."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute("SELECT digest, size FROM blobs ORDER BY last_used").fetchall()
+        for digest, size in rows:
+            if self.total_bytes <= target:
+                break
+            if digest == keep:
+                continue
+            # Open memory maps stay valid after the file is unlinked
+            try:
+                os.remove(self.path(digest))
+            except FileNotFoundError:
+                pass
+            self.conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self.conn.execute("DELETE FROM aliases WHERE digest = ?", (digest,))
+            self.total_bytes -= size
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": self.total_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_blob_cache():
+    """Process-wide blob store, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BlobCache(BLOB_CACHE_DIR, BLOB_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
@@ -2,6 +2,7 @@ import streamlit as st
 import google.generativeai as genai
 from config import GOOGLE_API_KEY
 from prompts import get_prompt
+import write_behind
 
 def send_message():
     retriever = st.session_state.get("retriever", None)
@@ -117,5 +118,8 @@ def send_message():
     selected_pdf = st.session_state.get("selected_pdf")
     if selected_pdf not in st.session_state.pdf_chats:
         st.session_state.pdf_chats[selected_pdf] = []
-    st.session_state.pdf_chats[selected_pdf].append({"user": user_input, "bot": bot_reply})
+    # Written by the background writer, so the reply is not delayed by MongoDB. The session
+    # gets a copy: the UI marks it (e.g. "animated") while the queued one may not be flushed yet
+    message = write_behind.queue_message(st.session_state.get("username"), selected_pdf, user_input, bot_reply)
+    st.session_state.pdf_chats[selected_pdf].append(dict(message))
     st.session_state.input_text = ""
@@ -0,0 +1,107 @@
+# collection_profiles.py
+from qdrant_client.models import (
+    Distance, VectorParams, HnswConfigDiff, SearchParams, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, VectorParamsDiff, Disabled,
+)
+from config import QDRANT_COLLECTION_PROFILE, QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, QDRANT_RESCORE_OVERSAMPLING
+
+# How a collection stores its vectors. Quantized profiles keep the compact copy in RAM
+# and the float32 originals on disk, which are only read to rescore the top candidates.
+#   float32: plain vectors in RAM (the previous behaviour)
+#   int8:    scalar quantization, ~4x less RAM, near-lossless after rescoring
+#   binary:  1 bit per dimension, ~32x less RAM; needs a larger oversample to keep recall
+PROFILES = {
+    "float32": {"quantization": None, "on_disk": False, "m": 16, "ef_construct": 100, "oversampling": 1.0},
+    "int8": {"quantization": "int8", "on_disk": True, "m": 16, "ef_construct": 100, "oversampling": 2.0},
+    "binary": {"quantization": "binary", "on_disk": True, "m": 16, "ef_construct": 128, "oversampling": 3.0},
+}
+
+
+def get_profile(name=None):
+    """Profile settings by name (default: QDRANT_COLLECTION_PROFILE), with config overrides applied."""
+    name = name or QDRANT_COLLECTION_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown collection profile {name!r}; expected one of {sorted(PROFILES)}")
+    profile = dict(PROFILES[name], name=name)
+    if QDRANT_HNSW_M is not None:
+        profile["m"] = QDRANT_HNSW_M
+    if QDRANT_HNSW_EF_CONSTRUCT is not None:
+        profile["ef_construct"] = QDRANT_HNSW_EF_CONSTRUCT
+    if QDRANT_RESCORE_OVERSAMPLING is not None and profile["quantization"]:
+        profile["oversampling"] = QDRANT_RESCORE_OVERSAMPLING
+    return profile
+
+
+def _quantization_config(profile):
+    if profile["quantization"] == "int8":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99,
+                                                                  always_ram=True))
+    if profile["quantization"] == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _profile_of(qdrant, collection_name):
+    """Quantization kind a collection actually uses (None, "int8" or "binary")."""
+    quantization = qdrant.get_collection(collection_name).config.quantization_config
+    if isinstance(quantization, ScalarQuantization):
+        return "int8"
+    if isinstance(quantization, BinaryQuantization):
+        return "binary"
+    return None
+
+
+def create_collection(qdrant, collection_name, vector_size, profile=None):
+    """Create a cosine collection laid out according to profile."""
+    profile = profile or get_profile()
+    qdrant.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=profile["on_disk"]),
+        hnsw_config=HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        quantization_config=_quantization_config(profile),
+    )
+
+
+def apply_profile(qdrant, collection_name, profile=None):
+    """
+    Convert an existing collection in place (Qdrant re-quantizes and rebuilds in the
+    background). Switching back to float32 removes the quantization; None would
+    leave it unchanged in update_collection, so it is disabled explicitly.
+    """
+    profile = profile or get_profile()
+    qdrant.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=profile["on_disk"])},
+        hnsw_config=HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        quantization_config=_quantization_config(profile) or Disabled.DISABLED,
+    )
+
+
+def search_params(profile=None, qdrant=None, collection_name=None):
+    """
+    Query-time parameters: search the quantized vectors, then rescore
+    limit * oversampling candidates against the on-disk originals.
+    Given a collection, its actual quantization decides (it may predate the
+    configured profile); oversampling comes from the profile of that kind.
+    """
+    profile = profile or get_profile()
+    if qdrant is not None and collection_name is not None:
+        quantization = _profile_of(qdrant, collection_name)
+        if quantization != profile["quantization"]:
+            profile = get_profile(quantization or "float32")
+    if not profile["quantization"]:
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        ignore=False, rescore=True, oversampling=profile["oversampling"]))
+
+
+def estimate_ram_bytes(points, dim, profile):
+    """Rough resident size: the vectors kept in RAM plus HNSW links (m*2 neighbours on layer 0)."""
+    if profile["quantization"] == "int8":
+        vector_bytes = dim
+    elif profile["quantization"] == "binary":
+        vector_bytes = (dim + 7) // 8
+    else:
+        vector_bytes = dim * 4
+    return points * (vector_bytes + profile["m"] * 2 * 4)
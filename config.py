@@ -11,12 +11,84 @@ QDRANT_API_KEY = st.secrets["QDRANT_API_KEY"]
 GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
 MONGO_URI = st.secrets["MONGO_URI"]
 COLLECTION_NAME = st.secrets.get("COLLECTION_NAME", "default_collection")
-GOOGLE_CLIENT_ID = st.secrets["GOOGLE_CLIENT_ID"]
-GOOGLE_CLIENT_SECRET = st.secrets["GOOGLE_CLIENT_SECRET_FILE"]
-REDIRECT_URI = st.secrets["REDIRECT_URI"]
-SCOPES = st.secrets["SCOPES"]
-File = st.secrets["file_id"]
-OAUTH_PORT = st.secrets["OAUTH_PORT"]
+# "per_document": one Qdrant collection per index; "multi_tenant": every index in one
+# collection, separated by indexed doc_id/owner payload fields
+QDRANT_STORAGE_MODE = st.secrets.get("QDRANT_STORAGE_MODE", "per_document")
+MULTI_TENANT_COLLECTION = st.secrets.get("MULTI_TENANT_COLLECTION", "pdfbot_chunks")
+# Layout of newly created collections: "float32", "int8" or "binary" (see collection_profiles.py).
+# The overrides below replace the profile's HNSW / rescoring defaults when set.
+QDRANT_COLLECTION_PROFILE = st.secrets.get("QDRANT_COLLECTION_PROFILE", "float32")
+QDRANT_HNSW_M = int(st.secrets["QDRANT_HNSW_M"]) if "QDRANT_HNSW_M" in st.secrets else None
+QDRANT_HNSW_EF_CONSTRUCT = int(st.secrets["QDRANT_HNSW_EF_CONSTRUCT"]) if "QDRANT_HNSW_EF_CONSTRUCT" in st.secrets else None
+QDRANT_RESCORE_OVERSAMPLING = (float(st.secrets["QDRANT_RESCORE_OVERSAMPLING"])
+                               if "QDRANT_RESCORE_OVERSAMPLING" in st.secrets else None)
+
+# === Document storage ===
+# "drive" (a Google Drive folder per user, needs OAuth), "local" (a directory on this
+# host, for on-prem deployments) or "memory" (process memory, for tests and offline benchmarks)
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", "drive")
+LOCAL_STORAGE_DIR = st.secrets.get("LOCAL_STORAGE_DIR", "data/pdfs")
+
+# Google OAuth / Drive settings are only required with the Drive backend
+_drive_secret = st.secrets.__getitem__ if STORAGE_BACKEND == "drive" else st.secrets.get
+GOOGLE_CLIENT_ID = _drive_secret("GOOGLE_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = _drive_secret("GOOGLE_CLIENT_SECRET_FILE")
+REDIRECT_URI = _drive_secret("REDIRECT_URI")
+SCOPES = _drive_secret("SCOPES")
+File = _drive_secret("file_id")
+OAUTH_PORT = _drive_secret("OAUTH_PORT")
+
+# === MongoDB connection pool (shared by every module, see db.py) ===
+MONGO_DB_NAME = st.secrets.get("MONGO_DB_NAME", "pdfbot")
+MONGO_MAX_POOL_SIZE = int(st.secrets.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(st.secrets.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(st.secrets.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(st.secrets.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(st.secrets.get("MONGO_SOCKET_TIMEOUT_MS", 20000))
+# Chat messages loaded per page (initially, and per "load earlier messages")
+CHAT_PAGE_SIZE = int(st.secrets.get("CHAT_PAGE_SIZE", 20))
+# Write-behind buffer for chat messages and user state: flush interval and queue size trigger
+WRITE_BUFFER_FLUSH_SECONDS = float(st.secrets.get("WRITE_BUFFER_FLUSH_SECONDS", 1.0))
+WRITE_BUFFER_MAX_PENDING = int(st.secrets.get("WRITE_BUFFER_MAX_PENDING", 200))
+
+# === Embedding output size ===
+# Leading components kept from each gemini-embedding-001 vector (Matryoshka truncation,
+# renormalized), e.g. 768 or 1536. Unset = full 3072. Existing indexes keep the size they
+# were built with, so changing this requires re-indexing them.
+EMBEDDING_OUTPUT_DIM = int(st.secrets["EMBEDDING_OUTPUT_DIM"]) if "EMBEDDING_OUTPUT_DIM" in st.secrets else None
+
+# === Embedding throughput (shared by all sessions in this process) ===
+EMBED_WORKERS = int(st.secrets.get("EMBED_WORKERS", 4))
+EMBED_REQUESTS_PER_MINUTE = int(st.secrets.get("EMBED_REQUESTS_PER_MINUTE", 100))
+EMBED_MAX_RETRIES = int(st.secrets.get("EMBED_MAX_RETRIES", 5))
+EMBED_CACHE_PATH = st.secrets.get("EMBED_CACHE_PATH", ".cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_MB = int(st.secrets.get("EMBED_CACHE_MAX_MB", 512))
+
+# === Shared Qdrant handles (one client and one vector store per index, for all sessions) ===
+VECTOR_STORE_CACHE_SIZE = int(st.secrets.get("VECTOR_STORE_CACHE_SIZE", 128))
+VECTOR_STORE_TTL_SECONDS = int(st.secrets.get("VECTOR_STORE_TTL_SECONDS", 1800))
+
+# === PDF parsing (process pool, bounded look-ahead) ===
+PARSE_WORKERS = int(st.secrets.get("PARSE_WORKERS", 2))
+PARSE_PAGES_PER_TASK = int(st.secrets.get("PARSE_PAGES_PER_TASK", 8))
+PARSE_MAX_PAGES_IN_MEMORY = int(st.secrets.get("PARSE_MAX_PAGES_IN_MEMORY", 64))
+
+# === Background jobs ===
+JOB_WORKERS = int(st.secrets.get("JOB_WORKERS", 2))
+JOB_STALE_SECONDS = int(st.secrets.get("JOB_STALE_SECONDS", 300))
+JOB_SPOOL_DIR = st.secrets.get("JOB_SPOOL_DIR", ".cache/jobs")
+# Deletion jobs: concurrent per-store deletes, and attempts per step before the job fails
+DELETE_FANOUT_WORKERS = int(st.secrets.get("DELETE_FANOUT_WORKERS", 8))
+DELETE_STEP_ATTEMPTS = int(st.secrets.get("DELETE_STEP_ATTEMPTS", 3))
+
+# === Drive metadata cache (folder ID and file listing per user) ===
+DRIVE_METADATA_TTL_SECONDS = int(st.secrets.get("DRIVE_METADATA_TTL_SECONDS", 300))
+# Local content-addressed PDF store (downloads, re-indexing, embeddings.py); LRU beyond the budget
+BLOB_CACHE_DIR = st.secrets.get("BLOB_CACHE_DIR", ".cache/blobs")
+BLOB_CACHE_MAX_MB = int(st.secrets.get("BLOB_CACHE_MAX_MB", 2048))
+# Resumable Drive uploads: chunk size (a multiple of 256 KB) and retries per chunk
+DRIVE_UPLOAD_CHUNK_MB = int(st.secrets.get("DRIVE_UPLOAD_CHUNK_MB", 8))
+DRIVE_UPLOAD_MAX_RETRIES = int(st.secrets.get("DRIVE_UPLOAD_MAX_RETRIES", 5))
 
 # === Google OAuth credentials (for personal Drive) ===
 # CLIENT_SECRETS_JSON = os.getenv("CLIENT_SECRETS_JSON")  # optional for local testing
@@ -1,45 +1,204 @@
 # ==== db.py ====
-from pymongo import MongoClient
-import streamlit as st
-import os
+import uuid
+import threading
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import MongoClient, DESCENDING
+from pymongo.errors import BulkWriteError
+from config import MONGO_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, CHAT_PAGE_SIZE
+from config import MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS
 
-# Replace this with your MongoDB Atlas connection string
-from config import MONGO_URI    
-DB_NAME = "rag_chatbot"
+# One pooled client per process. MongoClient is thread-safe and connects lazily, so every
+# module, Streamlit rerun and job thread shares its connection pool instead of opening its own.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            )
+        return _client
+
+
+def get_database():
+    return get_client()[MONGO_DB_NAME]
+
+
+def get_collection(name):
+    return get_database()[name]
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
 
 # === USERS ===
+# Accounts, chat state and Google credentials share one document per username.
+def users_collection():
+    return get_collection("users")
+
+
 def get_user(username):
-    return db.users.find_one({"username": username})
+    return users_collection().find_one({"username": username})
+
 
 def get_user_by_email(email):
-    return db.users.find_one({"email": email})
+    return users_collection().find_one({"email": email})
+
+
+def get_user_by_username_or_email(identifier):
+    return users_collection().find_one({"$or": [{"username": identifier}, {"email": identifier}]})
+
 
 def insert_user(username, email, password):
-    db.users.insert_one({
+    users_collection().insert_one({
         "username": username,
         "email": email,
         "password": password
     })
 
+
 def delete_user(username):
-    db.users.delete_one({"username": username})
+    """Remove the account together with its chat state, messages and stored credentials."""
+    users_collection().delete_one({"username": username})
+    delete_messages(username)
+
 
 # === CHATS ===
 def get_user_chats(username):
-    return db.user_chats.find_one({"username": username}) or {"pdf_chats": {}, "user_collections": [], "pdf_history": []}
+    """A user's PDF state (user_collections, pdf_history, selected_pdf), or None. Messages are separate."""
+    return users_collection().find_one(
+        {"username": username},
+        {"user_collections": 1, "pdf_history": 1, "selected_pdf": 1},
+    )
+
 
-def save_user_chats(username, pdf_chats, user_collections, pdf_history=None):
-    update_data = {"pdf_chats": pdf_chats, "user_collections": user_collections}
+def save_user_chats(username, user_collections, pdf_history=None):
+    update_data = {"user_collections": user_collections}
     if pdf_history is not None:
         update_data["pdf_history"] = pdf_history
-    db.user_chats.update_one(
+    users_collection().update_one(
         {"username": username},
         {"$set": update_data},
         upsert=True
     )
 
-def delete_user_chats(username):
-    db.user_chats.delete_one({"username": username})
+
+def remove_user_pdf(username, pdf_name, collection_name, file_id=None, before=None):
+    """
+    Drop one PDF's messages, collection and history entry from the stored user state.
+    With a file_id only that upload's history entry goes, and the collection only
+    once no history entry uses it; with before, only messages older than that.
+    A later upload under the same name is then left intact.
+    """
+    entry = {"name": pdf_name, "collection": collection_name}
+    if file_id is not None:
+        entry["file_id"] = file_id
+    users = users_collection()
+    users.update_one({"username": username}, {"$pull": {"pdf_history": entry}})
+    users.update_one(
+        {"username": username, "pdf_history.collection": {"$ne": collection_name}},
+        {"$pull": {"user_collections": collection_name}}
+    )
+    delete_messages(username, pdf_name, before=before)
+
+
+# === MESSAGES ===
+# One document per exchange: {username, pdf_name, ts, user, bot}. Appending is a single
+# small insert and history is read a page at a time, newest first, over the
+# (username, pdf_name, ts, _id) index declared in db_bootstrap.
+def messages_collection():
+    return get_collection("messages")
+
+
+def get_messages(username, pdf_name, before=None, limit=CHAT_PAGE_SIZE):
+    """
+    One page of a PDF's chat, oldest first, plus whether older messages exist.
+    before is the oldest message already shown; the page ends just before it.
+    """
+    query = {"username": username, "pdf_name": pdf_name}
+    if before is not None:
+        query["$or"] = [{"ts": {"$lt": before["ts"]}},
+                        {"ts": before["ts"], "_id": {"$lt": before["_id"]}}]
+    page = list(messages_collection().find(query).sort([("ts", DESCENDING), ("_id", DESCENDING)])
+                .limit(limit + 1))
+    has_more = len(page) > limit
+    return page[:limit][::-1], has_more
+
+
+def delete_messages(username, pdf_name=None, before=None):
+    query = {"username": username}
+    if pdf_name is not None:
+        query["pdf_name"] = pdf_name
+    if before is not None:
+        query["ts"] = {"$lt": before}
+    messages_collection().delete_many(query)
+
+
+_LEGACY_CHAT_NAMESPACE = uuid.UUID("6f0c8a52-3c1e-4d8e-9a57-2b4f1c7e9d10")
+
+
+def migrate_legacy_chats(username):
+    """
+    Move chats still embedded in the user document (the old pdf_chats field) into the
+    messages collection, once. Returns the number of messages moved.
+    """
+    user = users_collection().find_one({"username": username, "pdf_chats": {"$exists": True}}, {"pdf_chats": 1})
+    if not user:
+        return 0
+    now = datetime.now(timezone.utc)
+    messages = []
+    for pdf_name, chats in (user.get("pdf_chats") or {}).items():
+        chats = chats or []
+        for i, chat in enumerate(chats):
+            # Synthetic, strictly increasing timestamps keep the original order
+            # Deterministic _id (the same ObjectId type as live messages), so a run that
+            # stopped before the $unset below re-inserts nothing when repeated
+            message_id = ObjectId(uuid.uuid5(_LEGACY_CHAT_NAMESPACE, f"{username}\0{pdf_name}\0{i}").bytes[:12])
+            messages.append({"_id": message_id, "username": username, "pdf_name": pdf_name,
+                             "ts": now - timedelta(milliseconds=len(chats) - i),
+                             "user": chat.get("user"), "bot": chat.get("bot")})
+    if messages:
+        try:
+            messages_collection().insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+    users_collection().update_one({"_id": user["_id"]}, {"$unset": {"pdf_chats": ""}})
+    return len(messages)
+
+
+# === GOOGLE CREDENTIALS ===
+def get_google_creds(username):
+    user = users_collection().find_one({"username": username}, {"google_creds": 1})
+    return user.get("google_creds") if user else None
+
+
+def save_google_creds(username, creds_info, oauth_data=None):
+    """Store refreshed or newly granted credentials and forget any pending OAuth code."""
+    update = {"google_creds": creds_info}
+    if oauth_data is not None:
+        update["google_oauth_data"] = oauth_data
+    users_collection().update_one(
+        {"username": username},
+        {"$set": update, "$unset": {"google_oauth_code": ""}},
+        upsert=True
+    )
+
+
+def get_oauth_code(username):
+    user = users_collection().find_one({"username": username}, {"google_oauth_code": 1})
+    return user.get("google_oauth_code") if user else None
+
+
+def save_oauth_code(username, code):
+    users_collection().update_one(
+        {"username": username},
+        {"$set": {"google_oauth_code": code}},
+        upsert=True
+    )
@@ -0,0 +1,203 @@
+# db_bootstrap.py
+"""
+Declare MongoDB indexes, run schema migrations and verify that hot queries use an index.
+
+    python db_bootstrap.py              # migrate, then create indexes, then check plans
+    python db_bootstrap.py --indexes    # only create indexes (what app startup does)
+    python db_bootstrap.py --check      # only print explain-plan checks
+
+Migrations are versioned in the schema_migrations collection and each runs once.
+They run before index creation, because the unique indexes cannot be built while
+duplicate users exist.
+"""
+import argparse
+import threading
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+import db
+
+# (collection, keys, options)
+INDEXES = [
+    # Login looks users up by username or email; account creation checks both
+    ("users", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("users", [("email", ASCENDING)], {
+        "name": "email_unique", "unique": True,
+        # Documents created by the Drive OAuth upsert have no email yet
+        "partialFilterExpression": {"email": {"$type": "string"}},
+    }),
+    # Paginated chat history; _id breaks timestamp ties
+    ("messages", [("username", ASCENDING), ("pdf_name", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+     {"name": "user_pdf_ts"}),
+    # release_document finds the shared index a user's collection points to
+    ("documents", [("refs", ASCENDING)], {"name": "refs"}),
+    # Sidebar job lists and orphan recovery
+    ("jobs", [("username", ASCENDING), ("created_at", DESCENDING)], {"name": "username_created"}),
+    ("jobs", [("state", ASCENDING), ("heartbeat_at", ASCENDING)], {"name": "state_heartbeat"}),
+]
+
+# (collection, description, filter, sort) that must not scan the whole collection
+PLAN_CHECKS = [
+    ("users", "login lookup", {"$or": [{"username": "probe"}, {"email": "probe"}]}, None),
+    ("users", "username lookup", {"username": "probe"}, None),
+    ("users", "email lookup", {"email": "probe"}, None),
+    ("messages", "chat page", {"username": "probe", "pdf_name": "probe"}, [("ts", DESCENDING), ("_id", DESCENDING)]),
+    ("documents", "release lookup", {"refs": "probe"}, None),
+    ("jobs", "job list", {"username": "probe"}, [("created_at", DESCENDING)]),
+]
+
+
+_MERGED_FIELDS = ("user_collections", "pdf_history", "pdf_chats")
+
+
+def _merge_chat_state(docs):
+    """Union of the chat state of several documents for one user, the first document's entries first."""
+    merged = {}
+    collections = [c for d in docs for c in d.get("user_collections") or []]
+    if collections:
+        merged["user_collections"] = list(dict.fromkeys(collections))
+    history = {}
+    for d in docs:
+        for entry in d.get("pdf_history") or []:
+            history.setdefault((entry.get("name"), entry.get("collection"), entry.get("file_id")), entry)
+    if history:
+        merged["pdf_history"] = list(history.values())
+    chats = {}
+    for d in docs:
+        for pdf_name, pdf_chats in (d.get("pdf_chats") or {}).items():
+            chats.setdefault(pdf_name, []).extend(pdf_chats or [])
+    if chats:
+        merged["pdf_chats"] = chats
+    return merged
+
+
+def _merge_duplicate_users():
+    """
+    Collapse users that share a username into one document before the unique index
+    is built: the account document (the one with a password) wins, and fields it
+    lacks are filled from the others. Chat state is merged rather than picked:
+    user_collections and pdf_history are unioned, and embedded pdf_chats are
+    combined per PDF, so v2 moves every duplicate's messages.
+    """
+    users = db.users_collection()
+    duplicates = users.aggregate([
+        {"$group": {"_id": "$username", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ])
+    merged = 0
+    for group in duplicates:
+        docs = list(users.find({"_id": {"$in": group["ids"]}}))
+        docs.sort(key=lambda d: "password" not in d)
+        keep, others = docs[0], docs[1:]
+        fill = {}
+        for other in others:
+            for key, value in other.items():
+                if key in _MERGED_FIELDS:
+                    continue
+                if key != "_id" and key not in keep and key not in fill:
+                    fill[key] = value
+        fill.update(_merge_chat_state(docs))
+        if fill:
+            users.update_one({"_id": keep["_id"]}, {"$set": fill})
+        users.delete_many({"_id": {"$in": [d["_id"] for d in others]}})
+        merged += len(others)
+    return f"merged {merged} duplicate user document(s)"
+
+
+def _split_embedded_chats():
+    """Move every pdf_chats dict still embedded in a user document into the messages collection."""
+    moved = users = 0
+    for user in db.users_collection().find({"pdf_chats": {"$exists": True}}, {"username": 1}):
+        moved += db.migrate_legacy_chats(user["username"])
+        users += 1
+    return f"moved {moved} message(s) from {users} user document(s)"
+
+
+# Append only; a version never changes once released
+MIGRATIONS = [
+    (1, "merge duplicate users", _merge_duplicate_users),
+    (2, "split embedded chats into messages", _split_embedded_chats),
+]
+
+
+def run_migrations():
+    applied_col = db.get_collection("schema_migrations")
+    applied = {m["_id"] for m in applied_col.find({}, {"_id": 1})}
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"🔧 Migration {version}: {name}")
+        summary = migrate()
+        applied_col.insert_one({"_id": version, "name": name, "summary": summary,
+                                "applied_at": datetime.now(timezone.utc)})
+        print(f"✅ Migration {version}: {summary}")
+
+
+def ensure_indexes():
+    """Create every declared index (a no-op for ones that already exist). Returns failures."""
+    failures = []
+    for collection, keys, options in INDEXES:
+        try:
+            db.get_collection(collection).create_index(keys, **options)
+        except OperationFailure as e:
+            # Typically duplicates blocking a unique index; `python db_bootstrap.py` migrates them
+            failures.append((collection, options["name"], str(e)))
+            print(f"[WARN] Could not create index {collection}.{options['name']}: {e}")
+    return failures
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def check_plans():
+    """Explain each hot query; returns the ones whose winning plan is a collection scan."""
+    scans = []
+    for collection, description, query, sort in PLAN_CHECKS:
+        cursor = db.get_collection(collection).find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = [s for s in _stages(plan) if s]
+        ok = "COLLSCAN" not in stages
+        print(f"{'✅' if ok else '❌'} {collection}: {description} → {' ← '.join(stages)}")
+        if not ok:
+            scans.append((collection, description))
+    return scans
+
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+
+def bootstrap_indexes():
+    """App startup hook: create declared indexes once per process."""
+    global _bootstrapped
+    with _bootstrap_lock:
+        if not _bootstrapped:
+            ensure_indexes()
+            _bootstrapped = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--indexes", action="store_true", help="only create indexes")
+    parser.add_argument("--check", action="store_true", help="only run explain-plan checks")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(1 if check_plans() else 0)
+    if not args.indexes:
+        run_migrations()
+    failures = ensure_indexes()
+    scans = check_plans()
+    raise SystemExit(1 if failures or scans else 0)
+
+
+if __name__ == "__main__":
+    main()
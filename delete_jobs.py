@@ -0,0 +1,176 @@
+# delete_jobs.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import db
+import write_behind
+from config import DELETE_FANOUT_WORKERS, DELETE_STEP_ATTEMPTS
+from jobs import register_handler, submit_job, list_jobs, get_job, retry_job, jobs_col
+from doc_registry import release_document
+from embeddings_utils import drop_index
+from storage import get_storage
+
+
+def submit_pdf_delete_job(username, pdf_name, ref, file_id=None, fingerprint=None):
+    """
+    Queue removal of one PDF (its index reference, stored file, chat state and
+    messages) and return the job id at once. ref is the user's "username__pdfname";
+    the job only touches the upload identified by file_id and fingerprint, so a
+    later upload under the same name survives it.
+    """
+    write_behind.discard_pending(username, pdf_name)
+    return submit_job(
+        "delete",
+        username,
+        {"scope": "pdf", "pdf_name": pdf_name, "refs": [ref] if ref else [],
+         "fingerprint": fingerprint, "file_ids": [file_id] if file_id else []},
+        job_id=f"delete:pdf:{ref or pdf_name}:{file_id or fingerprint}",
+    )
+
+
+def get_pending_pdf_delete(username, pdf_name):
+    """The active deletion job for a PDF name of this user, or None; uploads under that name wait for it."""
+    return next((job for job in list_jobs(username, kind="delete", active_only=True)
+                 if job["params"].get("pdf_name") == pdf_name), None)
+
+
+def submit_account_delete_job(username, refs):
+    """Queue removal of a whole account: every index reference, every stored file, then the user's records."""
+    write_behind.discard_pending(username)
+    return submit_job(
+        "delete",
+        username,
+        # file_ids=None: whatever the backend lists for the user when the job runs
+        {"scope": "account", "refs": list(refs), "file_ids": None},
+        job_id=f"delete:account:{username}",
+    )
+
+
+def get_unfinished_account_deletion(username):
+    """
+    The user's account deletion job while it has not completed, or None. A failed one
+    is re-queued here, so the account cannot be logged into half-deleted.
+    """
+    job = get_job(f"delete:account:{username}")
+    if job is None or job["state"] == "done":
+        return None
+    if job["state"] == "failed":
+        retry_job(job["_id"])
+    return job
+
+
+_resumed = False
+_resume_lock = threading.Lock()
+
+
+def resume_failed_account_deletions():
+    """
+    App startup hook, once per process: re-queue failed account deletions. Nobody is
+    logged in to retry them, and recover_jobs only picks up queued or orphaned jobs.
+    """
+    global _resumed
+    with _resume_lock:
+        if _resumed:
+            return
+        _resumed = True
+    for job in jobs_col.find({"kind": "delete", "params.scope": "account", "state": "failed"}, {"_id": 1}):
+        retry_job(job["_id"])
+
+
+def _record(job_id, step, **fields):
+    # Durable per-step progress on the job document; retry_job keeps it, so a retried
+    # or recovered job skips the steps that already finished
+    jobs_col.update_one({"_id": job_id}, {"$set": {f"steps.{step}.{k}": v for k, v in fields.items()}})
+
+
+def _attempt(fn, *args):
+    """Run an idempotent step, retrying with backoff; the last error propagates."""
+    for attempt in range(DELETE_STEP_ATTEMPTS):
+        try:
+            return fn(*args)
+        except Exception:
+            if attempt == DELETE_STEP_ATTEMPTS - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _delete_index(job, step, ref):
+    state = (job.get("steps") or {}).get(step) or {}
+    if "drop" not in state:
+        # A second release_document no longer finds the shared document, so which
+        # collection to drop is recorded before the drop is attempted
+        state["drop"] = release_document(ref, job["params"].get("fingerprint"))
+        _record(job["_id"], step, drop=state["drop"])
+    if state["drop"]:
+        drop_index(state["drop"])
+
+
+def _delete_files(job):
+    username, params = job["username"], job["params"]
+    storage = get_storage()
+    if storage.requires_oauth and not db.get_google_creds(username):
+        # Drive was never connected, so nothing was stored
+        return
+    if params["file_ids"] is None:
+        file_ids = [f["id"] for f in storage.list(username)]
+    else:
+        # Files an earlier attempt already deleted are skipped
+        file_ids = [file_id for file_id in params["file_ids"] if storage.stat(username, file_id)]
+    failed = storage.delete_many(username, file_ids)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(file_ids)} file(s) could not be deleted: "
+                           + "; ".join(f"{file_id}: {e}" for file_id, e in list(failed.items())[:3]))
+    if params["scope"] == "account":
+        storage.remove_user(username)
+
+
+def _delete_records(job):
+    username, params = job["username"], job["params"]
+    if params["scope"] == "account":
+        write_behind.discard_pending(username)
+        db.delete_user(username)
+        get_storage().release(username)
+    else:
+        # Only this upload's history entry and the messages sent before the delete
+        db.remove_user_pdf(username, params["pdf_name"], params["refs"][0] if params["refs"] else None,
+                           file_id=params["file_ids"][0] if params["file_ids"] else None,
+                           before=job["created_at"])
+
+
+def _run_delete(job, report):
+    """
+    Index references and stored files are deleted concurrently; MongoDB records go
+    last, once everything else succeeded (Drive deletes still need the stored
+    credentials). Each finished step is recorded on the job document.
+    """
+    done_steps = {step for step, state in (job.get("steps") or {}).items() if state.get("done")}
+    steps = [(f"index{i}", _delete_index, (job, f"index{i}", ref)) for i, ref in enumerate(job["params"]["refs"])]
+    steps.append(("files", _delete_files, (job,)))
+    total = len(steps) + 1
+    done = sum(step in done_steps for step, _, _ in steps)
+    report(done, total)
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=DELETE_FANOUT_WORKERS, thread_name_prefix="delete") as pool:
+        futures = {pool.submit(_attempt, fn, *args): step for step, fn, args in steps if step not in done_steps}
+        for future in as_completed(futures):
+            step = futures[future]
+            try:
+                future.result()
+                _record(job["_id"], step, done=True)
+                done += 1
+                report(done, total)
+            except Exception as e:
+                errors.append(f"{step}: {e}")
+    if errors:
+        # Finished steps stay recorded; retry_job resumes with the failed ones
+        raise RuntimeError("; ".join(errors))
+
+    if "records" not in done_steps:
+        _attempt(_delete_records, job)
+        _record(job["_id"], "records", done=True)
+    report(total, total)
+    return {"indexes": len(job["params"]["refs"])}
+
+
+register_handler("delete", _run_delete)
@@ -0,0 +1,120 @@
+# doc_registry.py
+import hashlib
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from db import get_collection
+
+# --- MongoDB Setup ---
+documents_col = get_collection("documents")
+
+
+def fingerprint_pdf(pdf):
+    """
+    Content fingerprint (SHA-256) of a PDF given as a file path or in-memory bytes
+    (identical bytes → identical index).
+    """
+    if not isinstance(pdf, str):
+        return hashlib.sha256(pdf).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def shared_collection_name(fingerprint):
+    return f"doc__{fingerprint[:32]}"
+
+
+def acquire_document(fingerprint, ref):
+    """
+    Register ref (a user's "username__pdfname") against a shared document index.
+    Returns (collection_name, needs_index); needs_index is True until the index has been built.
+    Adding the same ref twice is a no-op, so the refcount is len(refs).
+    """
+    doc = documents_col.find_one_and_update(
+        {"_id": fingerprint},
+        {
+            "$addToSet": {"refs": ref},
+            "$setOnInsert": {
+                "collection": shared_collection_name(fingerprint),
+                "status": "pending",
+                "created_at": datetime.now(timezone.utc),
+            },
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["collection"], doc.get("status") != "ready"
+
+
+def mark_document_ready(fingerprint):
+    documents_col.update_one({"_id": fingerprint}, {"$set": {"status": "ready"}})
+
+
+def release_document(ref, fingerprint=None):
+    """
+    Drop ref from its shared document. Returns the Qdrant collection to delete now,
+    or None while other users still reference it. Collections created before
+    deduplication are not in the registry and are named after ref itself.
+    With a fingerprint, only that document is released: a newer upload under the
+    same name is left alone, and a repeated call finds nothing to release.
+    """
+    query = {"refs": ref} if fingerprint is None else {"_id": fingerprint, "refs": ref}
+    doc = documents_col.find_one_and_update(
+        query,
+        {"$pull": {"refs": ref}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        return ref if fingerprint is None else None
+    if doc.get("refs"):
+        print(f"[DEBUG] {doc['collection']} still referenced by {len(doc['refs'])} user(s)")
+        return None
+    # Last reference gone; only the caller that actually removes the record drops the index
+    result = documents_col.delete_one({"_id": doc["_id"], "refs": {"$size": 0}})
+    return doc["collection"] if result.deleted_count else None
+
+
+def get_document(fingerprint):
+    return documents_col.find_one({"_id": fingerprint}) if fingerprint else None
+
+
+def move_document(old_fingerprint, new_fingerprint, collection, ref):
+    """
+    Re-key an index that was updated in place for a revised PDF: the record for
+    the old bytes goes away and the same collection now serves new_fingerprint.
+    """
+    if old_fingerprint:
+        documents_col.delete_one({"_id": old_fingerprint})
+    documents_col.update_one(
+        {"_id": new_fingerprint},
+        {
+            "$set": {"collection": collection, "status": "ready"},
+            "$addToSet": {"refs": ref},
+            "$setOnInsert": {"created_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+    )
+
+
+# === INGESTION CHECKPOINTS ===
+checkpoints_col = get_collection("ingest_checkpoints")
+
+
+def get_checkpoint(collection_name, fingerprint):
+    """Number of leading chunks of this document already committed to the collection."""
+    doc = checkpoints_col.find_one({"_id": f"{collection_name}:{fingerprint}"})
+    return doc.get("committed", 0) if doc else 0
+
+
+def save_checkpoint(collection_name, fingerprint, committed, total):
+    checkpoints_col.update_one(
+        {"_id": f"{collection_name}:{fingerprint}"},
+        {"$set": {"committed": committed, "total": total, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def clear_checkpoint(collection_name, fingerprint):
+    checkpoints_col.delete_one({"_id": f"{collection_name}:{fingerprint}"})
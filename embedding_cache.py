@@ -0,0 +1,113 @@
+# embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from config import EMBED_CACHE_PATH, EMBED_CACHE_MAX_MB
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+    Keys are (model, output dimension, SHA-256 of chunk text); the least recently
+    used vectors are evicted once the stored bytes exceed max_bytes.
+    """
+
+    def __init__(self, path, max_bytes):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, dim, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}|{dim or 0}|{digest}"
+
+    def get_many(self, model, dim, texts):
+        """Return a list aligned with texts: the cached vector, or None on a miss."""
+        keys = [self.make_key(model, dim, t) for t in texts]
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                      [(now, k) for k in found])
+                self.conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return [list(array("f", found[k])) if k in found else None for k in keys]
+
+    def put_many(self, model, dim, texts, vectors):
+        now = time.time()
+        rows = []
+        for text, vec in zip(texts, vectors):
+            blob = array("f", vec).tobytes()
+            rows.append((self.make_key(model, dim, text), blob, len(blob), now))
+        with self.lock:
+            for key, _, size, _ in rows:
+                old = self.conn.execute("SELECT size FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self.total_bytes += size - (old[0] if old else 0)
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop least recently used rows until the cache is back under 90% of its budget."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        while self.total_bytes > target:
+            rows = self.conn.execute("SELECT key, size FROM embeddings ORDER BY last_used LIMIT 500").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": self.total_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache instance, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
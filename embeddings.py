@@ -1,18 +1,15 @@
 # embeddings.py
 import os
-import uuid
 from dotenv import load_dotenv
 from tqdm import tqdm
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from config import QDRANT_URL, QDRANT_API_KEY, GOOGLE_API_KEY
+from qdrant_client.models import PointStruct, Filter, FieldCondition, MatchValue, FilterSelector
+from config import QDRANT_URL, QDRANT_API_KEY
 # 1. Load environment variables
 
 
-from gdrive_utils import get_drive_service, download_pdf_from_drive
+from gdrive_utils import get_drive_service, fetch_pdf_to_cache
+from blob_cache import get_blob_cache
 
 # 2. PDF input (cloud)
 from config import File
@@ -20,60 +17,62 @@ file_id = File  # Google Drive file ID
 collection_name = "1. Self-Help Author Samuel Smiles.pdf"  # clean collection name
 
 drive_service = get_drive_service()
-pdf_bytes = download_pdf_from_drive(drive_service, file_id)
-import tempfile
-with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
-    tmp.write(pdf_bytes)
-    tmp.flush()
-    loader = PyPDFLoader(tmp.name)
-    documents = loader.load()
+# Downloaded once into the local blob cache; re-runs read it from disk
+fingerprint = fetch_pdf_to_cache(drive_service, file_id)  # SHA-256 of the PDF, as fingerprint_pdf
+pdf_path = get_blob_cache().path(fingerprint)
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=250,  # ensures overlap
-    length_function=len
-)
-docs = text_splitter.split_documents(documents)
+# 3. Stream pages (memory-mapped) from the parser pool and split them into chunks as they arrive
+from embeddings_utils import iter_pdf_chunks, batched
+from pdf_parser import count_pages
+total_pages = count_pages(pdf_path)
+print(f"📑 Streaming {total_pages} pages into overlapping chunks...")
+page_bar = tqdm(total=total_pages, desc="📄 Parsing", unit="page")
+docs = iter_pdf_chunks(pdf_path, collection_name, fingerprint=fingerprint,
+                       on_page=lambda page: page_bar.update(1))
 
-# Add metadata
-for i, doc in enumerate(docs):
-    doc.metadata.update({
-        "chunk_id": i,
-        "source": collection_name,
-        "page": doc.metadata.get("page", None),
-        "text_preview": doc.page_content[:200],
-    })
-
-print(f"📑 Prepared {len(docs)} chunks with overlap...")
-
-# 4. Initialize embeddings (Google Generative AI)
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/gemini-embedding-001",
-    api_key=GOOGLE_API_KEY
-)
+# 4. Initialize embeddings (Google Generative AI), truncated to EMBEDDING_OUTPUT_DIM like the app's
+from embeddings_utils import get_embedding_model, check_index_dimension, embedding_dim
+embeddings = get_embedding_model()
 
 # 5. Connect to Qdrant
 qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
-# 6. Create/recreate collection
-qdrant.recreate_collection(
-    collection_name=collection_name,
-    vectors_config=VectorParams(size=768, distance=Distance.COSINE),
-)
-print(f"📂 Collection '{collection_name}' created in Qdrant.")
+# 6. Create collection (kept across runs so an interrupted upload can resume)
+import itertools
+from doc_registry import get_checkpoint, save_checkpoint, clear_checkpoint
+from collection_profiles import create_collection, get_profile
+start = 0
+collection_ready = qdrant.collection_exists(collection_name)
+if collection_ready:
+    check_index_dimension(qdrant, collection_name)
+    # Drop points of an earlier revision of the Drive file (this script stores metadata at the
+    # payload top level), which would otherwise be retrieved next to the new ones
+    qdrant.delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(filter=Filter(must_not=[
+            FieldCondition(key="doc_fingerprint", match=MatchValue(value=fingerprint))])),
+        wait=True,
+    )
+    start = get_checkpoint(collection_name, fingerprint)
+    print(f"📂 Collection '{collection_name}' exists; resuming at chunk {start}.")
 
-# 7. Upload in batches
+# 7. Embed concurrently (shared rate limit) and upload in order
+from embeddings_utils import embed_batches, point_id
 batch_size = 50
-for i in tqdm(range(0, len(docs), batch_size), desc="🔼 Uploading", unit="batch"):
-    batch = docs[i: i + batch_size]
-
-    # Generate embeddings
-    vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+batches = batched(itertools.islice(docs, start, None), batch_size)
+committed = start
+for batch, vectors in tqdm(embed_batches(embeddings, batches), desc="🔼 Uploading", unit="batch"):
+    # Created from the first batch, so its size always matches the embedding model's output
+    if not collection_ready:
+        create_collection(qdrant, collection_name, len(vectors[0]))
+        collection_ready = True
+        print(f"📂 Collection '{collection_name}' created in Qdrant ({embedding_dim()} dims, "
+              f"{get_profile()['name']} profile).")
 
-    # Create points with UUIDs
+    # Point IDs derive from (document, chunk), so a re-run overwrites instead of duplicating
     points = [
         PointStruct(
-            id=str(uuid.uuid4()),
+            id=point_id(fingerprint, doc.metadata["chunk_id"]),
             vector=vec,
             payload=doc.metadata | {"page_content": doc.page_content, "text": doc.page_content}
         )
@@ -86,5 +85,13 @@ for i in tqdm(range(0, len(docs), batch_size), desc="🔼 Uploading", unit="batc
         points=points,
         wait=True
     )
+    committed += len(batch)
+    save_checkpoint(collection_name, fingerprint, committed, None)
+
+page_bar.close()
+clear_checkpoint(collection_name, fingerprint)
 
-print("✅ All chunks successfully uploaded to Qdrant with overlap!")
+from embedding_cache import get_embedding_cache
+stats = get_embedding_cache().stats()
+print(f"🗃️ Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+print(f"✅ All {committed} chunks successfully uploaded to Qdrant with overlap!")
@@ -1,15 +1,501 @@
+import uuid
+import time
+import hashlib
+import random
+import threading
+import math
+import itertools
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from langchain_qdrant import QdrantVectorStore
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
 import streamlit as st
 from config import QDRANT_URL, QDRANT_API_KEY, GOOGLE_API_KEY, COLLECTION_NAME
-from langchain_community.document_loaders import PyPDFLoader
+from config import QDRANT_STORAGE_MODE, MULTI_TENANT_COLLECTION, EMBEDDING_OUTPUT_DIM
+from config import EMBED_WORKERS, EMBED_REQUESTS_PER_MINUTE, EMBED_MAX_RETRIES
+from config import PARSE_WORKERS, PARSE_PAGES_PER_TASK, PARSE_MAX_PAGES_IN_MEMORY
+from pdf_parser import iter_pages, count_pages
+from embedding_cache import get_embedding_cache
+from doc_registry import get_checkpoint, save_checkpoint, clear_checkpoint, fingerprint_pdf
+from collection_profiles import create_collection, search_params
+from vector_registry import get_qdrant_client, vector_stores, search_settings
+from qdrant_client.models import PointStruct, PointIdsList, SetPayload, SetPayloadOperation
+from qdrant_client.models import Filter, FieldCondition, MatchValue, FilterSelector, KeywordIndexParams
 
 # embeddings_utils.py
-def build_or_load_index(collection_name=None, pdf_path=None):
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_NATIVE_DIM = 3072
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 250
+INDEX_BATCH_SIZE = 50
+POINT_ID_NAMESPACE = uuid.UUID("6f1c0e53-3c1b-4d59-9a3e-5b0d7f2a9c41")
+MULTI_TENANT = QDRANT_STORAGE_MODE == "multi_tenant"
+
+
+def get_text_splitter():
+    """Splitter shared by every ingestion path (upload sidebar and embeddings.py)."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,  # ensures overlap
+        length_function=len
+    )
+
+
+class TruncatedEmbeddings(Embeddings):
+    """
+    Matryoshka-style output size: keep the first dim components of every vector and
+    L2-renormalize them, identically for documents and queries. dim=None passes
+    vectors through at the model's native size.
+    """
+
+    def __init__(self, base, dim=None):
+        self.base = base
+        self.dim = dim
+
+    def _truncate(self, vector):
+        if self.dim is None:
+            return vector
+        if len(vector) < self.dim:
+            raise ValueError(f"Model returned {len(vector)} dimensions, fewer than EMBEDDING_OUTPUT_DIM={self.dim}")
+        vector = vector[:self.dim]
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        return [self._truncate(v) for v in self.base.embed_documents(texts)]
+
+    def embed_query(self, text):
+        return self._truncate(self.base.embed_query(text))
+
+
+def embedding_dim():
+    """Vector size every index built with the current settings has."""
+    return EMBEDDING_OUTPUT_DIM or EMBEDDING_NATIVE_DIM
+
+
+def get_embedding_model():
+    if EMBEDDING_OUTPUT_DIM is not None and not 0 < EMBEDDING_OUTPUT_DIM <= EMBEDDING_NATIVE_DIM:
+        raise ValueError(f"EMBEDDING_OUTPUT_DIM must be between 1 and {EMBEDDING_NATIVE_DIM}")
+    base = GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        api_key=GOOGLE_API_KEY
+    )
+    return TruncatedEmbeddings(base, EMBEDDING_OUTPUT_DIM)
+
+
+_shared_model = None
+_shared_model_lock = threading.Lock()
+
+
+def get_shared_embedding_model():
+    """One embedding model per process, used by every session's vector store and by jobs."""
+    global _shared_model
+    with _shared_model_lock:
+        if _shared_model is None:
+            _shared_model = get_embedding_model()
+        return _shared_model
+
+
+class TokenBucket:
+    """Thread-safe token bucket; one instance is shared by every embedding worker in the process."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, rate_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Process-wide: concurrent uploads from different sessions share one Gemini quota
+embed_rate_limiter = TokenBucket(EMBED_REQUESTS_PER_MINUTE)
+
+
+def _is_quota_error(e):
+    msg = str(e).lower()
+    return "429" in msg or "resource_exhausted" in msg or "resource exhausted" in msg or "quota" in msg
+
+
+def embed_with_retry(embedding_model, texts, max_retries=EMBED_MAX_RETRIES):
+    """Embed one batch under the shared rate limit, retrying quota errors with jittered backoff."""
+    for attempt in range(max_retries + 1):
+        embed_rate_limiter.acquire()
+        try:
+            return embedding_model.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_quota_error(e):
+                raise
+            delay = random.uniform(0, min(60.0, 2 ** attempt))
+            print(f"[DEBUG] Embedding quota hit, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts_cached(embedding_model, texts):
+    """Serve vectors from the embedding cache and only call the API for misses."""
+    cache = get_embedding_cache()
+    vectors = cache.get_many(EMBEDDING_MODEL, EMBEDDING_OUTPUT_DIM, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = embed_with_retry(embedding_model, [texts[i] for i in missing])
+        cache.put_many(EMBEDDING_MODEL, EMBEDDING_OUTPUT_DIM, [texts[i] for i in missing], fresh)
+        for i, vec in zip(missing, fresh):
+            vectors[i] = vec
+    return vectors
+
+
+def embed_batches(embedding_model, batches, workers=EMBED_WORKERS):
+    """
+    Embed batches on a bounded thread pool and yield (batch, vectors) in input order,
+    so callers can upsert as results arrive. At most 2 * workers batches are in flight.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+        pending = deque()
+        batches = iter(batches)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < workers * 2:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                texts = [doc.page_content for doc in batch]
+                pending.append((batch, pool.submit(embed_texts_cached, embedding_model, texts)))
+            if not pending:
+                return
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def point_id(fingerprint, chunk_id, scope=None):
+    """
+    Deterministic Qdrant point ID, so re-running an upsert never duplicates a chunk.
+    scope (the index name) keeps IDs distinct when several indexes share one collection.
+    """
+    key = f"{fingerprint}:{chunk_id}" if scope is None else f"{scope}:{fingerprint}:{chunk_id}"
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, key))
+
+
+# === Storage mode: an "index" is either its own collection or a doc_id slice of one ===
+def physical_collection(index_name):
+    """Qdrant collection that stores an index's points."""
+    return MULTI_TENANT_COLLECTION if MULTI_TENANT else index_name
+
+
+def doc_filter(index_name):
+    """Payload filter selecting one index in multi-tenant mode (None otherwise)."""
+    if not MULTI_TENANT:
+        return None
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=index_name))])
+
+
+def index_exists(qdrant, index_name):
+    if not MULTI_TENANT:
+        return qdrant.collection_exists(index_name)
+    if not qdrant.collection_exists(MULTI_TENANT_COLLECTION):
+        return False
+    points, _ = qdrant.scroll(MULTI_TENANT_COLLECTION, scroll_filter=doc_filter(index_name),
+                              limit=1, with_payload=False, with_vectors=False)
+    return bool(points)
+
+
+def index_dimension(qdrant, index_name):
+    """Vector size recorded in the index's collection config (fixed at creation)."""
+    return qdrant.get_collection(physical_collection(index_name)).config.params.vectors.size
+
+
+def check_index_dimension(qdrant, index_name):
+    """Refuse to query an index whose vectors differ in size from the configured embedding output."""
+    size = index_dimension(qdrant, index_name)
+    if size != embedding_dim():
+        raise ValueError(f"Index {index_name} stores {size}-dim vectors but EMBEDDING_OUTPUT_DIM gives "
+                         f"{embedding_dim()}; re-index it or change the setting back")
+
+
+def get_retriever(vectordb, index_name, k=4):
+    """
+    Retriever over one index, filtered to its doc_id in multi-tenant mode.
+    Quantized profiles rescore oversampled candidates against the original vectors.
+    """
+    search_kwargs = {"k": k}
+    if MULTI_TENANT:
+        search_kwargs["filter"] = doc_filter(index_name)
+    # The index's own quantization, which need not match the configured profile;
+    # looked up once per collection, since app.py rebuilds the retriever on every rerun
+    collection_name = physical_collection(index_name)
+    cached = search_settings.get(collection_name)
+    if cached is None:
+        cached = search_settings.put(collection_name, (search_params(qdrant=get_qdrant_client(),
+                                                                     collection_name=collection_name),))
+    params = cached[0]
+    if params is not None:
+        search_kwargs["search_params"] = params
+    return vectordb.as_retriever(search_kwargs=search_kwargs)
+
+
+def iter_pdf_chunks(pdf, source, fingerprint=None, on_page=None):
+    """
+    Stream a PDF (file path or bytes) as prompt-sized chunks with metadata, page by
+    page as the parser pool produces them, so embedding starts before the whole PDF
+    is parsed. Each chunk carries its page's and its own content hash for incremental
+    re-indexing, plus the document fingerprint its point ID is derived from.
+    """
+    if fingerprint is None:
+        fingerprint = fingerprint_pdf(pdf)
+    splitter = get_text_splitter()
+    chunk_id = 0
+    pages = iter_pages(pdf, workers=PARSE_WORKERS, pages_per_task=PARSE_PAGES_PER_TASK,
+                       max_pages_in_memory=PARSE_MAX_PAGES_IN_MEMORY)
+    for page in pages:
+        page.metadata["page_hash"] = content_hash(page.page_content)
+        for doc in splitter.split_documents([page]):
+            doc.metadata.update({
+                "chunk_id": chunk_id,
+                "source": source,
+                "page": doc.metadata.get("page", None),
+                "chunk_hash": content_hash(doc.page_content),
+                "doc_fingerprint": fingerprint,
+                "text_preview": doc.page_content[:200],
+            })
+            chunk_id += 1
+            yield doc
+        if on_page:
+            on_page(page.metadata["page"])
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ensure_collection(qdrant, collection_name, vector_size):
+    """
+    Create the index's collection once; later batches only upsert into it.
+    Vector storage, quantization and HNSW settings come from QDRANT_COLLECTION_PROFILE.
+    In multi-tenant mode this is the shared collection, with keyword indexes on
+    doc_id (tenant key) and owner so filtered search and delete stay fast.
+    """
+    collection_name = physical_collection(collection_name)
+    if qdrant.collection_exists(collection_name):
+        existing = qdrant.get_collection(collection_name).config.params.vectors.size
+        if existing != vector_size:
+            raise ValueError(f"Collection {collection_name} stores {existing}-dim vectors, "
+                             f"cannot add {vector_size}-dim ones")
+        return
+    create_collection(qdrant, collection_name, vector_size)
+    search_settings.invalidate(collection_name)
+    if MULTI_TENANT:
+        qdrant.create_payload_index(collection_name, "doc_id",
+                                    field_schema=KeywordIndexParams(type="keyword", is_tenant=True))
+        qdrant.create_payload_index(collection_name, "owner", field_schema=KeywordIndexParams(type="keyword"))
+    print(f"[DEBUG] Created collection {collection_name} (dim={vector_size})")
+
+
+def index_documents(qdrant, embedding_model, collection_name, docs, batch_size=INDEX_BATCH_SIZE,
+                    on_progress=None, start=0, on_commit=None, owner=None):
+    """
+    Embed docs (a list or a stream) concurrently and upsert each batch over the
+    given client, in order. The collection is created from the first batch's vector size.
+    Payload layout matches LangChain's QdrantVectorStore (page_content + metadata).
+    start skips chunks an earlier run already committed; on_commit(n) fires after
+    each upsert with the number of leading chunks now stored. For streams the
+    total passed to on_progress is None. Returns the number of chunks stored.
+    In multi-tenant mode points are tagged with doc_id (the index name) and owner.
+    """
+    total = len(docs) if hasattr(docs, "__len__") else None
+    done = start
+    collection_ready = False
+    batches = batched(itertools.islice(docs, start, None), batch_size)
+    for batch, vectors in embed_batches(embedding_model, batches):
+        if not collection_ready:
+            ensure_collection(qdrant, collection_name, len(vectors[0]))
+            collection_ready = True
+
+        tenant = {"doc_id": collection_name, "owner": owner} if MULTI_TENANT else {}
+        points = [
+            PointStruct(
+                id=point_id(doc.metadata["doc_fingerprint"], doc.metadata["chunk_id"],
+                            scope=collection_name if MULTI_TENANT else None),
+                vector=vec,
+                payload={"page_content": doc.page_content, "metadata": doc.metadata, **tenant}
+            )
+            for doc, vec in zip(batch, vectors)
+        ]
+        qdrant.upsert(collection_name=physical_collection(collection_name), points=points, wait=True)
+        done += len(batch)
+        if on_commit:
+            on_commit(done)
+        if on_progress:
+            on_progress(done, total)
+    print(f"[DEBUG] Embedding cache stats: {get_embedding_cache().stats()}")
+    return done
+
+
+def _chunk_key(metadata):
+    # Page numbers are left out so pages shifted by an insertion still match
+    return (metadata.get("page_hash"), metadata.get("chunk_hash"))
+
+
+def sync_documents(qdrant, embedding_model, collection_name, docs, on_progress=None, owner=None):
+    """
+    Bring an existing collection in line with a revised PDF: embed and upsert only
+    chunks whose (page hash, chunk hash) is new, delete points whose chunk is gone,
+    and keep every other point's vector. Kept chunks that moved (another page or
+    chunk_id after the revision) get their position payload updated in place.
+    Returns (added, deleted, kept).
+    """
+    existing = defaultdict(list)
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=physical_collection(collection_name),
+            scroll_filter=doc_filter(collection_name),
+            limit=1000,
+            offset=offset,
+            with_payload=["metadata.page_hash", "metadata.chunk_hash", "metadata.page", "metadata.chunk_id"],
+            with_vectors=False,
+        )
+        for point in points:
+            metadata = (point.payload or {}).get("metadata") or {}
+            existing[_chunk_key(metadata)].append((point.id, metadata.get("page"), metadata.get("chunk_id")))
+        if offset is None:
+            break
+
+    kept = 0
+    moved = []
+
+    def changed(stream):
+        nonlocal kept
+        for doc in stream:
+            entries = existing.get(_chunk_key(doc.metadata))
+            if entries:
+                point, page, chunk_id = entries.pop()
+                kept += 1
+                if (page, chunk_id) != (doc.metadata.get("page"), doc.metadata.get("chunk_id")):
+                    moved.append(SetPayloadOperation(set_payload=SetPayload(
+                        payload={"page": doc.metadata.get("page"), "chunk_id": doc.metadata["chunk_id"]},
+                        points=[point], key="metadata")))
+            else:
+                yield doc
+
+    # Add before deleting so the index never goes empty mid-update
+    added = index_documents(qdrant, embedding_model, collection_name, changed(docs),
+                            on_progress=on_progress, owner=owner)
+    for i in range(0, len(moved), 1000):
+        qdrant.batch_update_points(collection_name=physical_collection(collection_name),
+                                   update_operations=moved[i:i + 1000], wait=True)
+    to_delete = [point_id for entries in existing.values() for point_id, _, _ in entries]
+    for i in range(0, len(to_delete), 1000):
+        qdrant.delete(collection_name=physical_collection(collection_name),
+                      points_selector=PointIdsList(points=to_delete[i:i + 1000]), wait=True)
+    print(f"[DEBUG] Incremental re-index of {collection_name}: "
+          f"{added} added, {len(to_delete)} deleted, {kept} unchanged ({len(moved)} moved)")
+    return added, len(to_delete), kept
+
+
+def resumable_index(qdrant, embedding_model, collection_name, docs, fingerprint, on_progress=None, owner=None):
+    """
+    index_documents with a persisted checkpoint: an interrupted build of the same
+    document resumes after the last committed batch instead of starting over.
+    Returns the number of chunks stored.
+    """
+    start = 0
+    if index_exists(qdrant, collection_name):
+        start = get_checkpoint(collection_name, fingerprint)
+    if start:
+        print(f"[DEBUG] Resuming {collection_name} at chunk {start}")
+    done = index_documents(
+        qdrant, embedding_model, collection_name, docs,
+        on_progress=on_progress,
+        start=start,
+        on_commit=lambda committed: save_checkpoint(collection_name, fingerprint, committed, None),
+        owner=owner,
+    )
+    clear_checkpoint(collection_name, fingerprint)
+    return done
+
+
+def drop_index(collection_name):
+    """
+    Delete an index: its whole collection, or in multi-tenant mode its doc_id
+    points (delete-by-filter). Both calls are synchronous, so no polling is needed.
+    """
+    qdrant = get_qdrant_client()
+    vector_stores.invalidate(collection_name)
+    if MULTI_TENANT:
+        if qdrant.collection_exists(MULTI_TENANT_COLLECTION):
+            qdrant.delete(collection_name=MULTI_TENANT_COLLECTION,
+                          points_selector=FilterSelector(filter=doc_filter(collection_name)), wait=True)
+            print(f"[DEBUG] Dropped index {collection_name} from {MULTI_TENANT_COLLECTION}")
+    elif qdrant.collection_exists(collection_name):
+        qdrant.delete_collection(collection_name=collection_name)
+        search_settings.invalidate(collection_name)
+        print(f"[DEBUG] Dropped collection {collection_name}")
+
+
+def ingest_pdf(collection_name, pdf, incremental=False, fingerprint=None, on_progress=None,
+               qdrant=None, embedding_model=None, owner=None):
+    """
+    Parse, chunk, embed and upsert a PDF (file path or bytes) into collection_name.
+    No Streamlit calls, so it can run on background job threads.
+    on_progress(page, total_pages, chunks) fires after every committed batch.
+    Returns the number of chunks written.
+    """
+    if qdrant is None:
+        qdrant = get_qdrant_client()
+    if embedding_model is None:
+        embedding_model = get_shared_embedding_model()
+    print(f"[DEBUG] Creating new collection for PDF: {collection_name}")
+    if fingerprint is None:
+        fingerprint = fingerprint_pdf(pdf)
+    total_pages = count_pages(pdf)
+    progress = {"page": 0}
+
+    def on_page(page):
+        progress["page"] = page + 1
+
+    def on_batch(done, total):
+        if on_progress:
+            on_progress(progress["page"], total_pages, done)
+
+    docs = iter_pdf_chunks(pdf, collection_name, fingerprint=fingerprint, on_page=on_page)
+    if incremental and index_exists(qdrant, collection_name):
+        added, _, _ = sync_documents(qdrant, embedding_model, collection_name, docs,
+                                     on_progress=on_batch, owner=owner)
+        return added
+    return resumable_index(qdrant, embedding_model, collection_name, docs, fingerprint,
+                           on_progress=on_batch, owner=owner)
+
+
+def build_or_load_index(collection_name=None, pdf_path=None, incremental=False, fingerprint=None, pdf_bytes=None):
     """
     Build or load a Qdrant index.
-    - If pdf_path is provided → build new collection (user__pdfname).
+    - If pdf_bytes (parsed in memory) or pdf_path is provided → build new collection (user__pdfname).
+    - If a PDF is given and incremental → update an existing collection with only the changed chunks.
     - If only collection_name → load existing collection.
+    Loaded stores come from the process-wide registry, so switching between PDFs
+    that any session has already opened makes no network calls.
     """
 
     print("[DEBUG] build_or_load_index called")
@@ -18,64 +504,65 @@ def build_or_load_index(collection_name=None, pdf_path=None):
         return None
 
     try:
-        embedding_model = GoogleGenerativeAIEmbeddings(
-            model="models/gemini-embedding-001",
-            api_key=GOOGLE_API_KEY
-        )
+        embedding_model = get_shared_embedding_model()
+        qdrant = get_qdrant_client()
 
-        from qdrant_client import QdrantClient
-        qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        pdf = pdf_bytes if pdf_bytes is not None else pdf_path
+        if pdf is not None:  # ✅ Create new collection
+            progress_bar = st.progress(0, text="Embedding and indexing PDF...")
 
-        if pdf_path:  # ✅ Create new collection
-            print(f"[DEBUG] Creating new collection for PDF: {collection_name}")
-            loader = PyPDFLoader(pdf_path)
-            docs = loader.load()
+            def on_progress(page, total_pages, chunks):
+                progress_bar.progress(min(page / max(total_pages, 1), 1.0),
+                                      text=f"Embedding and indexing PDF... (page {page}/{total_pages}, "
+                                           f"{chunks} chunks)")
 
-            progress_bar = st.progress(0, text="Embedding and indexing PDF...")
-            total = len(docs)
-            batch_size = max(1, total // 20)
-
-            for i in range(0, total, batch_size):
-                batch = docs[i:i + batch_size]
-                QdrantVectorStore.from_documents(
-                    batch,
-                    embedding_model,
-                    location=QDRANT_URL,
-                    api_key=QDRANT_API_KEY,
-                    collection_name=collection_name
-                )
-                progress_bar.progress(min((i + batch_size) / total, 1.0),
-                                      text=f"Embedding and indexing PDF... ({min(i + batch_size, total)}/{total})")
+            ingest_pdf(collection_name, pdf, incremental=incremental, fingerprint=fingerprint,
+                       on_progress=on_progress, qdrant=qdrant, embedding_model=embedding_model)
 
             progress_bar.empty()
+            if not index_exists(qdrant, collection_name):
+                st.error("No text could be extracted from this PDF.")
+                return None
             st.success(f"PDF indexed into collection: {collection_name}")
-            return QdrantVectorStore.from_existing_collection(
-                collection_name=collection_name,
-                location=QDRANT_URL,
-                api_key=QDRANT_API_KEY,
-                embedding=embedding_model
-            )
+            return vector_stores.put(collection_name, QdrantVectorStore(
+                client=qdrant,
+                collection_name=physical_collection(collection_name),
+                embedding=embedding_model,
+                validate_collection_config=False  # just built with embedding_model
+            ))
 
         elif collection_name:  # ✅ Load existing collection
-            existing_collections = [c.name for c in qdrant.get_collections().collections]
-            if collection_name not in existing_collections:
+            cached = vector_stores.get(collection_name)
+            if cached is not None:
+                print(f"[DEBUG] Reusing shared vector store for {collection_name}")
+                return cached
+
+            # Point lookup instead of listing every collection
+            if not index_exists(qdrant, collection_name):
                 st.error(f"Collection {collection_name} not found!")
                 return None
 
+            # Compare against the recorded vector size instead of LangChain's check,
+            # which embeds a dummy query on every load
+            try:
+                check_index_dimension(qdrant, collection_name)
+            except ValueError as e:
+                st.error(str(e))
+                return None
+
             print(f"[DEBUG] Loading existing collection: {collection_name}")
-            return QdrantVectorStore.from_existing_collection(
-                collection_name=collection_name,
-                location=QDRANT_URL,
-                api_key=QDRANT_API_KEY,
-                embedding=embedding_model
-            )
+            return vector_stores.put(collection_name, QdrantVectorStore(
+                client=qdrant,
+                collection_name=physical_collection(collection_name),
+                embedding=embedding_model,
+                validate_collection_config=False
+            ))
 
         else:  # fallback
-            
+
             return None
 
     except Exception as e:
         print(f"[DEBUG] Exception in build_or_load_index: {e}")
         st.error(f"Failed to load Qdrant index: {e}")
-        return None 
-    
\ No newline at end of file
+        return None
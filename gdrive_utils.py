@@ -3,10 +3,17 @@ import streamlit as st
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload, HttpRequest, build_http
+from googleapiclient.errors import HttpError
 import io
 import json
 import os
+import time
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timedelta
+import google_auth_httplib2
 from google_auth_oauthlib.flow import Flow
 
 from dotenv import load_dotenv
@@ -24,20 +31,121 @@ flow = Flow.from_client_config(client_config, scopes=SCOPES)
 
 
 # Temporary port for OAuth, must be different from Streamlit's (8501)
-from config import OAUTH_PORT
+from config import OAUTH_PORT, DRIVE_METADATA_TTL_SECONDS
+from blob_cache import get_blob_cache
+from config import DRIVE_UPLOAD_CHUNK_MB, DRIVE_UPLOAD_MAX_RETRIES
+
+# === Per-user Drive service cache ===
+# username -> (service, credentials, fingerprint of the stored grant)
+_drive_services = {}
+# Guards the dicts only; building and token refreshes hold the user's own lock, so a
+# slow refresh never stalls Drive access for other users
+_drive_services_lock = threading.Lock()
+_user_locks = {}
+# One HTTP connection per thread, reused by every request that thread makes
+_thread_http = threading.local()
+# Refresh access tokens this long before they expire, so no request hits an expired token
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def _user_lock(username):
+    with _drive_services_lock:
+        return _user_locks.setdefault(username, threading.Lock())
+
+
+def _creds_fingerprint(creds_info):
+    # The grant, not the access token: a session holding a token from before another
+    # session's refresh still matches and reuses the service
+    grant = [creds_info.get("refresh_token"), creds_info.get("client_id")]
+    return hashlib.sha256(json.dumps(grant).encode()).hexdigest()
+
+
+def _http_for_thread():
+    # build_http() keeps the client library's default socket timeout
+    if not hasattr(_thread_http, "http"):
+        _thread_http.http = build_http()
+    return _thread_http.http
+
+
+def _build_request(http, *args, **kwargs):
+    # httplib2 is not thread-safe; run each request on its thread's own connection so
+    # one cached service can serve several sessions (tabs) of the same user at once
+    return HttpRequest(google_auth_httplib2.AuthorizedHttp(http.credentials, http=_http_for_thread()),
+                       *args, **kwargs)
+
+
+def _build_drive_service(creds):
+    # The Drive v3 discovery document ships with google-api-python-client; no network fetch
+    return build("drive", "v3", credentials=creds, static_discovery=True, cache_discovery=False,
+                 requestBuilder=_build_request)
+
+
+def _refresh_if_expiring(username, creds):
+    """Refresh the token shortly before expiry and persist it. Returns the new creds JSON, or None."""
+    if not creds.refresh_token:
+        return None
+    # google-auth stores expiry as naive UTC
+    if creds.expiry is not None and creds.expiry - TOKEN_REFRESH_MARGIN > datetime.utcnow():
+        return None
+    from google.auth.transport.requests import Request
+    import db
+    creds.refresh(Request())
+    refreshed = json.loads(creds.to_json())
+    db.save_google_creds(username, refreshed)
+    print(f"[DEBUG] Token refreshed for {username}")
+    return refreshed
+
+
+def cached_drive_service(username, creds_info):
+    """
+    Drive service for username, built once and reused while the stored credentials
+    stay the same. Tokens are refreshed proactively; a refreshed token updates the
+    cached credentials in place, so the service is kept. Returns None when the
+    credentials are expired and cannot be refreshed.
+    """
+    from google.oauth2.credentials import Credentials
+    fingerprint = _creds_fingerprint(creds_info)
+    with _user_lock(username):
+        with _drive_services_lock:
+            entry = _drive_services.get(username)
+        if entry is None or entry[2] != fingerprint:
+            creds = Credentials.from_authorized_user_info(creds_info)
+            entry = (_build_drive_service(creds), creds, fingerprint)
+            print(f"[DEBUG] Built Drive service for {username}")
+        service, creds, _ = entry
+        refreshed = _refresh_if_expiring(username, creds)
+        if refreshed is not None:
+            entry = (service, creds, _creds_fingerprint(refreshed))
+        with _drive_services_lock:
+            if not creds.valid:
+                _drive_services.pop(username, None)
+                return None
+            _drive_services[username] = entry
+        # The cached credentials may hold a newer token than the caller's copy
+        creds_info = json.loads(creds.to_json())
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    # Job threads have no session to update
+    if get_script_run_ctx() is not None:
+        st.session_state["google_creds"] = creds_info
+        st.session_state["drive_connected"] = True
+    return service
+
+
+def invalidate_drive_service(username):
+    """Forget a user's cached service (credentials replaced, logout, account deletion)."""
+    with _drive_services_lock:
+        _drive_services.pop(username, None)
+
 def get_drive_service():
 
     """Handles Google OAuth (Streamlit + MongoDB compatible) and returns authorized Drive service."""
-    from pymongo import MongoClient
+    import db
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import Flow, InstalledAppFlow
     from googleapiclient.discovery import build
     import json, urllib.parse, os
 
-    from config import MONGO_URI, SCOPES, REDIRECT_URI, OAUTH_PORT
-    client = MongoClient(MONGO_URI)
-    db = client["pdfbot"]
-    chats_col = db["users"]
+    from config import SCOPES, REDIRECT_URI, OAUTH_PORT
 
     username = st.session_state.get("username") or st.session_state.get("persist_username")
     # Try to restore username from OAuth 'state' param if missing
@@ -57,35 +165,17 @@ def get_drive_service():
     # --- Try to load creds from session or MongoDB ---
     creds_info = st.session_state.get("google_creds")
     if not creds_info:
-        user_data = chats_col.find_one({"username": username})
-        creds_info = user_data.get("google_creds") if user_data else None
+        creds_info = db.get_google_creds(username)
 
-    # --- If credentials exist and valid, return Drive service immediately ---
+    # --- If credentials exist and valid (or refreshable), return the cached Drive service ---
     if creds_info:
         try:
-            creds = Credentials.from_authorized_user_info(creds_info)
-            if creds and creds.valid:
-                st.session_state["google_creds"] = creds_info
-                st.session_state["drive_connected"] = True
-                print(f"[DEBUG] Returning cached Drive service for {username}")
-                # No rerun needed for cached credentials
-                return build("drive", "v3", credentials=creds)
-
-            # Try refresh if expired
-            if creds.expired and creds.refresh_token:
-                from google.auth.transport.requests import Request
-                creds.refresh(Request())
-                refreshed = json.loads(creds.to_json())
-                st.session_state["google_creds"] = refreshed
-                chats_col.update_one(
-                    {"username": username},
-                    {"$set": {"google_creds": refreshed}},
-                    upsert=True
-                )
-                print(f"[DEBUG] Token refreshed for {username}")
-                # No rerun needed for refreshed credentials
-                return build("drive", "v3", credentials=creds)
+            service = cached_drive_service(username, creds_info)
+            if service is not None:
+                # No rerun needed for cached or refreshed credentials
+                return service
         except Exception as e:
+            invalidate_drive_service(username)
             print(f"[DEBUG] Invalid creds for {username}: {e}")
             st.warning("Stored Google credentials invalid or expired. Please reconnect.")
 
@@ -102,18 +192,13 @@ def get_drive_service():
         # --- Save OAuth code instantly to Mongo if present ---
         if code:
             print(f"[DEBUG] OAuth code received for user {username}: {code[:10]}...")
-            chats_col.update_one(
-                {"username": username},
-                {"$set": {"google_oauth_code": code}},
-                upsert=True
-            )
+            db.save_oauth_code(username, code)
             st.session_state["google_oauth_code"] = code
             # Remove ?code=... from URL to avoid rerun loop
             st.query_params
 
         # --- Reuse code from Mongo or session if exists ---
-        code = st.session_state.get("google_oauth_code") or \
-               (chats_col.find_one({"username": username}) or {}).get("google_oauth_code")
+        code = st.session_state.get("google_oauth_code") or db.get_oauth_code(username)
 
         if not code:
             # No code found — show Connect button
@@ -139,14 +224,8 @@ def get_drive_service():
             }
 
             # Save creds and clear old code
-            chats_col.update_one(
-                {"username": username},
-                {"$set": {
-                    "google_creds": creds_info,
-                    "google_oauth_data": oauth_data
-                }, "$unset": {"google_oauth_code": ""}},
-                upsert=True
-            )
+            db.save_google_creds(username, creds_info, oauth_data)
+            invalidate_drive_service(username)
 
             # Update Streamlit session
             st.session_state["google_creds"] = creds_info
@@ -157,7 +236,7 @@ def get_drive_service():
             st.success("Go Back to the main app and refresh to continue.")
             print(f"[DEBUG] OAuth success for {username}")
             st.rerun()
-            return build("drive", "v3", credentials=creds)
+            return cached_drive_service(username, creds_info)
         
 
         except Exception as e:
@@ -185,84 +264,313 @@ def get_drive_service():
         st.session_state["google_creds"] = creds_info
         st.session_state["google_oauth_data"] = oauth_data
 
-        chats_col.update_one(
-            {"username": username},
-            {"$set": {"google_creds": creds_info, "google_oauth_data": oauth_data}},
-            upsert=True
-        )
+        db.save_google_creds(username, creds_info, oauth_data)
+        invalidate_drive_service(username)
 
         st.success("✅ Google Drive connected locally!")
         st.success("Go Back to the main app to continue.")
         print(f"[DEBUG] Local OAuth success for {username}")
         st.rerun()
-        return build("drive", "v3", credentials=creds)
+        return cached_drive_service(username, creds_info)
 
 
 
     # ...existing code...
+# === Per-user Drive metadata cache ===
+# username -> {"lock", "folder_id", "folder_at", "files": {file_id: {id, name, size, md5Checksum, webViewLink}},
+#              "fetched_at"}; every read and update of an entry holds its lock, so an
+# upload or delete that lands during a re-list is applied to the new listing, not lost
+_metadata = {}
+_metadata_lock = threading.Lock()
+FILE_FIELDS = "id, name, size, md5Checksum, webViewLink"
+
+
+def _metadata_entry(username):
+    with _metadata_lock:
+        return _metadata.setdefault(username, {"lock": threading.RLock(), "folder_id": None, "folder_at": 0.0,
+                                               "files": None, "fetched_at": 0.0})
+
+
+def invalidate_drive_metadata(username):
+    """Forget a user's cached folder and file listing."""
+    with _metadata_lock:
+        _metadata.pop(username, None)
+
+
 def get_or_create_user_folder(drive_service, username):
-    """Get or create a folder for the user in Google Drive. Returns folder ID."""
-    # Search for folder
-    query = f"mimeType='application/vnd.google-apps.folder' and name='{username}' and trashed=false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    folders = results.get('files', [])
-    if folders:
-        return folders[0]['id']
-    # Create folder if not found
-    file_metadata = {
-        'name': username,
-        'mimeType': 'application/vnd.google-apps.folder'
-    }
-    folder = drive_service.files().create(body=file_metadata, fields='id').execute()
-    return folder['id']
-
-def upload_pdf_to_drive(drive_service, pdf_name, pdf_bytes, username=None):
-    """Uploads PDF to the user's folder in Google Drive."""
+    """Get or create a folder for the user in Google Drive. Returns folder ID (cached per user)."""
+    entry = _metadata_entry(username)
+    with entry["lock"]:
+        # Looked up again after the TTL, in case the folder was removed or replaced in Drive
+        if entry["folder_id"] and time.monotonic() - entry["folder_at"] <= DRIVE_METADATA_TTL_SECONDS:
+            return entry["folder_id"]
+        # Search for folder
+        query = f"mimeType='application/vnd.google-apps.folder' and name='{username}' and trashed=false"
+        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
+        folders = results.get('files', [])
+        if folders:
+            entry["folder_id"], entry["folder_at"] = folders[0]['id'], time.monotonic()
+            return entry["folder_id"]
+        # Create folder if not found
+        file_metadata = {
+            'name': username,
+            'mimeType': 'application/vnd.google-apps.folder'
+        }
+        folder = drive_service.files().create(body=file_metadata, fields='id').execute()
+        entry["folder_id"], entry["folder_at"] = folder['id'], time.monotonic()
+        entry["files"], entry["fetched_at"] = {}, time.monotonic()
+        return folder['id']
+
+
+def _list_folder(drive_service, folder_id):
+    """Every file in a folder, following nextPageToken until the listing is complete."""
+    files = {}
+    page_token = None
+    while True:
+        results = drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            pageSize=1000,
+            pageToken=page_token,
+        ).execute()
+        for f in results.get('files', []):
+            files[f['id']] = f
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+
+def get_user_file_index(drive_service, username, refresh=False):
+    """
+    file_id -> metadata for the user's folder, re-listed after DRIVE_METADATA_TTL_SECONDS.
+    Returns a snapshot, safe to iterate while other sessions update the cache.
+    """
+    entry = _metadata_entry(username)
+    with entry["lock"]:
+        stale = time.monotonic() - entry["fetched_at"] > DRIVE_METADATA_TTL_SECONDS
+        if refresh or entry["files"] is None or stale:
+            folder_id = get_or_create_user_folder(drive_service, username)
+            entry["files"] = _list_folder(drive_service, folder_id)
+            entry["fetched_at"] = time.monotonic()
+        return dict(entry["files"])
+
+
+def _remember_file(username, file):
+    entry = _metadata_entry(username)
+    with entry["lock"]:
+        if entry["files"] is not None:
+            entry["files"][file['id']] = file
+
+
+def _forget_file(username, file_id):
+    entry = _metadata_entry(username)
+    with entry["lock"]:
+        if entry["files"] is not None:
+            entry["files"].pop(file_id, None)
+
+
+def _check_owned(drive_service, username, file_id):
+    """Local ownership check; a miss re-lists once in case the file was added elsewhere."""
+    if file_id in get_user_file_index(drive_service, username):
+        return
+    if file_id not in get_user_file_index(drive_service, username, refresh=True):
+        raise Exception("File not found in user's folder.")
+
+
+def _pdf_media(pdf):
+    """
+    Resumable, chunked media over bytes or a readable file object (e.g. Streamlit's
+    UploadedFile), so only one chunk is read into the request at a time.
+    """
+    stream = io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf
+    stream.seek(0)
+    return MediaIoBaseUpload(stream, mimetype="application/pdf",
+                             chunksize=DRIVE_UPLOAD_CHUNK_MB * 1024 * 1024, resumable=True)
+
+
+def _upload_in_chunks(request, on_progress=None):
+    """
+    Send a resumable upload chunk by chunk. Each chunk is retried on its own
+    (exponential backoff) and resumes from the last byte Drive confirmed, so a
+    network error costs at most one chunk. on_progress(fraction) after each chunk.
+    """
+    response = None
+    while response is None:
+        status, response = request.next_chunk(num_retries=DRIVE_UPLOAD_MAX_RETRIES)
+        if status and on_progress:
+            on_progress(status.progress())
+    if on_progress:
+        on_progress(1.0)
+    return response
+
+
+def _cache_uploaded(pdf, file):
+    """Seed the blob cache with bytes just sent to Drive, so reading them back stays local."""
+    if file.get("md5Checksum"):
+        if not isinstance(pdf, (bytes, bytearray)):
+            pdf.seek(0)
+        get_blob_cache().put(pdf, file_id=file["id"], revision=file["md5Checksum"])
+
+
+def upload_pdf_to_drive(drive_service, pdf_name, pdf, username=None, on_progress=None):
+    """Uploads a PDF (bytes or file object) to the user's folder in Google Drive, resumably."""
     folder_id = None
     if username:
         folder_id = get_or_create_user_folder(drive_service, username)
         # Check for existing file in user's folder
-        query = f"name='{pdf_name}' and '{folder_id}' in parents and trashed=false"
-        results = drive_service.files().list(q=query, fields="files(id, name, webViewLink)").execute()
-        files = results.get('files', [])
-        if files:
+        existing = next((f for f in get_user_file_index(drive_service, username).values()
+                         if f['name'] == pdf_name), None)
+        if existing:
             # Return the existing file info
-            return {"id": files[0]["id"], "webViewLink": files[0].get("webViewLink", "")}
+            return {"id": existing["id"], "webViewLink": existing.get("webViewLink", "")}
     # If not found, upload new file
-    media = MediaIoBaseUpload(io.BytesIO(pdf_bytes), mimetype="application/pdf")
     file_metadata = {"name": pdf_name}
     if folder_id:
         file_metadata["parents"] = [folder_id]
-    uploaded = (
-        drive_service.files()
-        .create(body=file_metadata, media_body=media, fields="id, webViewLink")
-        .execute()
-    )
+    request = drive_service.files().create(body=file_metadata, media_body=_pdf_media(pdf), fields=FILE_FIELDS)
+    uploaded = _upload_in_chunks(request, on_progress)
+    if username:
+        _remember_file(username, uploaded)
+    _cache_uploaded(pdf, uploaded)
     return uploaded
 
 
 
+def replace_pdf_in_drive(drive_service, file_id, pdf, username=None, on_progress=None):
+    """Overwrites the content of an existing Drive file (same ID, new revision), resumably."""
+    request = drive_service.files().update(fileId=file_id, media_body=_pdf_media(pdf), fields=FILE_FIELDS)
+    updated = _upload_in_chunks(request, on_progress)
+    if username:
+        _remember_file(username, updated)
+    _cache_uploaded(pdf, updated)
+    return updated
+
+
 def list_user_files(drive_service, username):
-    """List all files in the user's folder on Google Drive."""
-    folder_id = get_or_create_user_folder(drive_service, username)
-    query = f"'{folder_id}' in parents and trashed=false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    return results.get('files', [])
+    """List all files in the user's folder on Google Drive (every page, cached)."""
+    return list(get_user_file_index(drive_service, username).values())
 
 def delete_pdf_from_drive(drive_service, file_id, username=None):
     """Delete PDF from the user's folder in Google Drive."""
     if username:
-        # Optionally verify file is in user's folder
-        user_files = list_user_files(drive_service, username)
-        if not any(f['id'] == file_id for f in user_files):
-            raise Exception("File not found in user's folder.")
+        _check_owned(drive_service, username, file_id)
     drive_service.files().delete(fileId=file_id).execute()
+    if username:
+        _forget_file(username, file_id)
+
+# === Batched requests ===
+# Drive accepts at most 100 calls in one batch HTTP request
+DRIVE_BATCH_SIZE = 100
+# Per-call statuses worth retrying in a later batch (rate limits, server errors)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retryable(error):
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 403:
+        # Drive reports (user) rate limits as 403; other 403s are permanent
+        return b"ratelimitexceeded" in (error.content or b"").lower()
+    return error.resp.status in RETRYABLE_STATUSES
+
+
+def execute_batch(drive_service, requests, max_retries=DRIVE_UPLOAD_MAX_RETRIES):
+    """
+    Run {key: HttpRequest} as batch HTTP requests of up to DRIVE_BATCH_SIZE calls.
+    Returns (responses, errors), both keyed like requests: one failed call never fails
+    the others. Rate-limited or 5xx calls are retried in a later batch with backoff.
+    """
+    responses, errors = {}, {}
+    pending = dict(requests)
+    for attempt in range(max_retries + 1):
+        items = list(pending.items())
+        for start in range(0, len(items), DRIVE_BATCH_SIZE):
+            chunk = items[start:start + DRIVE_BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    errors[request_id] = exception
+                else:
+                    responses[request_id] = response
+
+            batch = drive_service.new_batch_http_request(callback=callback)
+            for key, request in chunk:
+                batch.add(request, request_id=key)
+            try:
+                batch.execute()
+            except Exception as e:
+                # The batch itself failed (network, auth): every call in it failed
+                for key, _ in chunk:
+                    errors[key] = e
+        pending = {key: requests[key] for key, error in errors.items() if _retryable(error)}
+        if not pending or attempt == max_retries:
+            break
+        for key in pending:
+            del errors[key]
+        time.sleep(2 ** attempt)
+    return responses, errors
+
+
+def delete_files(drive_service, file_ids, username=None):
+    """
+    Delete many files in batches. With a username, ownership is checked against the
+    cached folder listing once for all of them (re-listed at most once), not per file.
+    Returns {file_id: error} for files that could not be deleted; files that are
+    already gone count as deleted, so a retry is harmless.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    errors = {}
+    if username:
+        index = get_user_file_index(drive_service, username)
+        if any(file_id not in index for file_id in file_ids):
+            index = get_user_file_index(drive_service, username, refresh=True)
+        for file_id in file_ids:
+            if file_id not in index:
+                errors[file_id] = Exception("File not found in user's folder.")
+        file_ids = [file_id for file_id in file_ids if file_id not in errors]
+    _, failed = execute_batch(drive_service, {file_id: drive_service.files().delete(fileId=file_id)
+                                              for file_id in file_ids})
+    for file_id, error in failed.items():
+        if not (isinstance(error, HttpError) and error.resp.status == 404):
+            errors[file_id] = error
+    if username:
+        for file_id in file_ids:
+            if file_id not in errors:
+                _forget_file(username, file_id)
+    return errors
+
 
 def download_pdf_from_drive(drive_service, file_id, username=None):
-    """Downloads PDF from the user's folder in Google Drive."""
+    """Downloads PDF from the user's folder in Google Drive (served from the local blob cache when present)."""
+    cache = get_blob_cache()
+    # A concurrent put may evict the blob between fetching and opening it; fetch once more then
+    for _ in range(2):
+        pdf_file = cache.open(fetch_pdf_to_cache(drive_service, file_id, username=username))
+        if pdf_file is not None:
+            with pdf_file:
+                return pdf_file[:]
+    raise FileNotFoundError("evicted from the local cache; please try again")
+
+
+def fetch_pdf_to_cache(drive_service, file_id, username=None):
+    """
+    Content hash of a Drive PDF in the local blob cache. Only the first access to a
+    file revision downloads it (in chunks, straight to disk); later ones are local.
+    """
     if username:
-        user_files = list_user_files(drive_service, username)
-        if not any(f['id'] == file_id for f in user_files):
-            raise Exception("File not found in user's folder.")
-    request = drive_service.files().get_media(fileId=file_id)
-    return request.execute()
+        _check_owned(drive_service, username, file_id)
+        revision = get_user_file_index(drive_service, username)[file_id].get("md5Checksum")
+    else:
+        revision = drive_service.files().get(fileId=file_id, fields="md5Checksum").execute().get("md5Checksum")
+    cache = get_blob_cache()
+    digest = cache.lookup(file_id, revision) if revision else None
+    if digest:
+        return digest
+    with tempfile.TemporaryFile() as f:
+        downloader = MediaIoBaseDownload(f, drive_service.files().get_media(fileId=file_id),
+                                         chunksize=DRIVE_UPLOAD_CHUNK_MB * 1024 * 1024)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk(num_retries=DRIVE_UPLOAD_MAX_RETRIES)
+        f.seek(0)
+        return cache.put(f, file_id=file_id, revision=revision)
@@ -0,0 +1,84 @@
+# ingest_jobs.py
+import os
+import hashlib
+from config import JOB_SPOOL_DIR
+from jobs import register_handler, submit_job
+from embeddings_utils import ingest_pdf, drop_index
+from doc_registry import mark_document_ready, release_document, move_document
+
+
+def _spool_path(job_id):
+    # One copy per job: each job removes its own when it finishes, so jobs for the
+    # same PDF (another collection, or an incremental update) never lose their input
+    return os.path.join(JOB_SPOOL_DIR, f"{hashlib.sha256(job_id.encode()).hexdigest()}.pdf")
+
+
+def _spool(pdf_bytes, job_id):
+    """Persist the upload so the job survives reruns and app restarts (atomic write)."""
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    path = _spool_path(job_id)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    return path
+
+
+def submit_ingest_job(username, ref, collection_name, pdf_bytes, fingerprint, incremental=False, old_fingerprint=None):
+    """
+    Queue indexing of an uploaded PDF into collection_name and return the job id.
+    ref is the user's "username__pdfname"; on success the shared document is marked
+    ready (or, for an incremental update, re-keyed from old_fingerprint).
+    """
+    job_id = f"ingest:{collection_name}:{fingerprint}"
+    _spool(pdf_bytes, job_id)
+    return submit_job(
+        "ingest",
+        username,
+        {
+            "ref": ref,
+            "collection": collection_name,
+            "fingerprint": fingerprint,
+            "incremental": incremental,
+            "old_fingerprint": old_fingerprint,
+        },
+        job_id=job_id,
+    )
+
+
+def _run_ingest(job, report):
+    params = job["params"]
+    path = _spool_path(job["_id"])
+    if not os.path.exists(path):
+        raise RuntimeError("The uploaded PDF is no longer available; please upload it again.")
+    try:
+        chunks = ingest_pdf(
+            params["collection"],
+            path,
+            incremental=params["incremental"],
+            fingerprint=params["fingerprint"],
+            on_progress=lambda page, total_pages, done: report(page, total_pages, chunks=done),
+            owner=job["username"],
+        )
+        if params["incremental"]:
+            move_document(params["old_fingerprint"], params["fingerprint"], params["collection"], params["ref"])
+        else:
+            if not chunks:
+                raise RuntimeError("No text could be extracted from this PDF.")
+            mark_document_ready(params["fingerprint"])
+        return {"chunks": chunks}
+    except Exception:
+        if not params["incremental"]:
+            collection_to_drop = release_document(params["ref"])
+            if collection_to_drop:
+                drop_index(collection_to_drop)
+        raise
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+register_handler("ingest", _run_ingest)
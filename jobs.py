@@ -0,0 +1,229 @@
+# jobs.py
+import time
+import uuid
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+from config import JOB_WORKERS, JOB_STALE_SECONDS
+from db import get_collection
+
+# --- MongoDB Setup ---
+jobs_col = get_collection("jobs")
+
+ACTIVE_STATES = ["queued", "running"]
+
+# Identifies this app process; it heartbeats only the jobs it runs, so a dead process's jobs go stale
+RUNNER_ID = uuid.uuid4().hex
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+# Job ids handed to this process's pool and not finished yet
+_local_jobs = set()
+_local_lock = threading.Lock()
+
+
+def register_handler(kind, handler):
+    """
+    Register handler(job, report) for a job kind. report(done, total, **fields)
+    records progress (and keeps the job's heartbeat fresh); the handler's return
+    value is stored as the job result.
+    """
+    _handlers[kind] = handler
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _get_executor():
+    """Process-wide worker pool; lives outside Streamlit's script-rerun thread."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+            threading.Thread(target=_maintain_jobs, name="job-recovery", daemon=True).start()
+        return _executor
+
+
+def _enqueue(job_id):
+    with _local_lock:
+        if job_id in _local_jobs:
+            return
+        _local_jobs.add(job_id)
+    _get_executor().submit(_run_job, job_id)
+
+
+def _stale_cutoff():
+    return _now() - timedelta(seconds=JOB_STALE_SECONDS)
+
+
+def submit_job(kind, username, params, job_id=None):
+    """
+    Queue a job and return its id. With an explicit job_id, submitting again while
+    that job is still active returns the existing job instead of starting a second one;
+    a running job whose runner stopped heartbeating is queued again instead.
+    """
+    job_id = job_id or uuid.uuid4().hex
+    active = jobs_col.find_one({
+        "_id": job_id,
+        "$or": [{"state": "queued"}, {"state": "running", "heartbeat_at": {"$gte": _stale_cutoff()}}],
+    }, {"_id": 1})
+    if active:
+        return job_id
+    jobs_col.replace_one(
+        {"_id": job_id},
+        {
+            "_id": job_id,
+            "kind": kind,
+            "username": username,
+            "params": params,
+            "state": "queued",
+            "progress": {"done": 0, "total": None},
+            "error": None,
+            "result": None,
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "heartbeat_at": _now(),
+            "runner": None,
+        },
+        upsert=True,
+    )
+    _enqueue(job_id)
+    print(f"[DEBUG] Queued {kind} job {job_id} for {username}")
+    return job_id
+
+
+def retry_job(job_id):
+    """
+    Re-queue a failed job as it is: params and anything the handler recorded on the
+    job document are kept, so a handler that records its finished steps resumes
+    instead of starting over. Returns False unless the job had failed.
+    """
+    result = jobs_col.update_one(
+        {"_id": job_id, "state": "failed"},
+        {"$set": {"state": "queued", "error": None, "finished_at": None, "heartbeat_at": _now(), "runner": None}},
+    )
+    if not result.modified_count:
+        return False
+    _enqueue(job_id)
+    print(f"[DEBUG] Re-queued job {job_id}")
+    return True
+
+
+def _claim(job_id):
+    """Atomically take a queued job, or a running one whose runner stopped heartbeating."""
+    return jobs_col.find_one_and_update(
+        {
+            "_id": job_id,
+            "$or": [
+                {"state": "queued"},
+                {"state": "running", "heartbeat_at": {"$lt": _stale_cutoff()}},
+            ],
+        },
+        {"$set": {"state": "running", "runner": RUNNER_ID, "started_at": _now(), "heartbeat_at": _now()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _run_job(job_id):
+    try:
+        _execute(job_id)
+    finally:
+        with _local_lock:
+            _local_jobs.discard(job_id)
+
+
+def _execute(job_id):
+    job = _claim(job_id)
+    if job is None:
+        return
+    handler = _handlers.get(job["kind"])
+    if handler is None:
+        jobs_col.update_one({"_id": job_id}, {"$set": {
+            "state": "failed", "error": f"No handler for job kind {job['kind']}", "finished_at": _now()}})
+        return
+
+    last_write = [0.0]
+
+    def report(done, total=None, **fields):
+        # Throttled: one write per second is enough for a polling sidebar. The heartbeat
+        # itself does not depend on progress: _maintain_jobs refreshes it on a timer.
+        if time.monotonic() - last_write[0] < 1.0 and done != total:
+            return
+        last_write[0] = time.monotonic()
+        update = {"progress.done": done, "progress.total": total, "heartbeat_at": _now()}
+        update.update({f"progress.{k}": v for k, v in fields.items()})
+        jobs_col.update_one({"_id": job_id, "runner": RUNNER_ID}, {"$set": update})
+
+    started = time.monotonic()
+    try:
+        result = handler(job, report)
+        jobs_col.update_one({"_id": job_id}, {"$set": {
+            "state": "done", "result": result, "error": None,
+            "finished_at": _now(), "duration_s": round(time.monotonic() - started, 3)}})
+        print(f"[DEBUG] Job {job_id} done in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        traceback.print_exc()
+        jobs_col.update_one({"_id": job_id}, {"$set": {
+            "state": "failed", "error": str(e),
+            "finished_at": _now(), "duration_s": round(time.monotonic() - started, 3)}})
+
+
+def recover_jobs():
+    """
+    Re-queue jobs left queued or orphaned (stale heartbeat) by another app process,
+    e.g. one that was restarted. Jobs already in this process's pool are skipped.
+    """
+    orphans = jobs_col.find(
+        {"$or": [{"state": "queued"}, {"state": "running", "heartbeat_at": {"$lt": _stale_cutoff()}}]},
+        {"_id": 1},
+    )
+    for job in orphans:
+        with _local_lock:
+            if job["_id"] in _local_jobs:
+                continue
+        print(f"[DEBUG] Recovering job {job['_id']}")
+        _enqueue(job["_id"])
+
+
+def _heartbeat():
+    """Keep the heartbeat of every job this process is running fresh."""
+    jobs_col.update_many({"state": "running", "runner": RUNNER_ID}, {"$set": {"heartbeat_at": _now()}})
+
+
+def _maintain_jobs():
+    """
+    Heartbeat this process's running jobs and recover orphans, every third of
+    JOB_STALE_SECONDS. A job that was running when its process died goes stale one
+    JOB_STALE_SECONDS later and is picked up on a following pass, by whichever
+    process gets there first.
+    """
+    while True:
+        for step in (_heartbeat, recover_jobs):
+            try:
+                step()
+            except Exception:
+                traceback.print_exc()
+        time.sleep(max(1, JOB_STALE_SECONDS / 3))
+
+
+def get_job(job_id):
+    return jobs_col.find_one({"_id": job_id}) if job_id else None
+
+
+def list_jobs(username, kind=None, active_only=False):
+    query = {"username": username}
+    if kind:
+        query["kind"] = kind
+    if active_only:
+        query["state"] = {"$in": ACTIVE_STATES}
+    return list(jobs_col.find(query).sort("created_at", -1))
+
+
+def start_job_runner():
+    """Start the worker pool (with heartbeats and orphan recovery) if this process has not yet."""
+    _get_executor()
@@ -0,0 +1,93 @@
+# migrate_to_multi_tenant.py
+"""
+Copy per-document Qdrant collections into the single multi-tenant collection.
+
+    python migrate_to_multi_tenant.py [--delete-source] [--dry-run]
+
+Each source collection becomes doc_id=<collection name> (the name the app already
+stores in user_collections / pdf_history), so no MongoDB records need rewriting.
+Re-running is safe: copied point IDs are derived from (collection, source point ID).
+Run with QDRANT_STORAGE_MODE = "multi_tenant"; the app reads the shared collection from then on.
+"""
+import argparse
+import uuid
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+from config import QDRANT_URL, QDRANT_API_KEY, MULTI_TENANT_COLLECTION
+from embeddings_utils import POINT_ID_NAMESPACE, ensure_collection, MULTI_TENANT
+
+
+def _owner(collection_name):
+    # Legacy per-user collections are named "username__pdfname"; shared ones "doc__<hash>"
+    if collection_name.startswith("doc__") or "__" not in collection_name:
+        return None
+    return collection_name.split("__", 1)[0]
+
+
+def _vector_size(qdrant, collection_name):
+    vectors = qdrant.get_collection(collection_name).config.params.vectors
+    return vectors.size
+
+
+def migrate_collection(qdrant, collection_name, dry_run=False):
+    """Copy one collection's points into the multi-tenant collection. Returns points copied."""
+    owner = _owner(collection_name)
+    copied = 0
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(collection_name, limit=256, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        if points and not dry_run:
+            qdrant.upsert(
+                collection_name=MULTI_TENANT_COLLECTION,
+                points=[
+                    PointStruct(
+                        id=str(uuid.uuid5(POINT_ID_NAMESPACE, f"{collection_name}:{p.id}")),
+                        vector=p.vector,
+                        payload={**(p.payload or {}), "doc_id": collection_name, "owner": owner},
+                    )
+                    for p in points
+                ],
+                wait=True,
+            )
+        copied += len(points)
+        if offset is None:
+            return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delete-source", action="store_true", help="drop each source collection after copying")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be copied")
+    args = parser.parse_args()
+
+    if not MULTI_TENANT:
+        raise SystemExit("Set QDRANT_STORAGE_MODE = 'multi_tenant' before migrating.")
+
+    qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    sources = [c.name for c in qdrant.get_collections().collections if c.name != MULTI_TENANT_COLLECTION]
+    print(f"📂 {len(sources)} collection(s) to migrate into '{MULTI_TENANT_COLLECTION}'")
+
+    target_size = None
+    if qdrant.collection_exists(MULTI_TENANT_COLLECTION):
+        target_size = _vector_size(qdrant, MULTI_TENANT_COLLECTION)
+
+    for name in sources:
+        size = _vector_size(qdrant, name)
+        if target_size is None:
+            target_size = size
+            if not args.dry_run:
+                # Creates the shared collection with its doc_id/owner payload indexes
+                ensure_collection(qdrant, name, size)
+        if size != target_size:
+            print(f"⏭️ Skipping '{name}': dim {size} does not match {target_size}")
+            continue
+        copied = migrate_collection(qdrant, name, dry_run=args.dry_run)
+        print(f"✅ '{name}': {copied} point(s) {'would be ' if args.dry_run else ''}copied")
+        if args.delete_source and not args.dry_run:
+            qdrant.delete_collection(name)
+            print(f"🗑 Dropped source collection '{name}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# pdf_parser.py
+import io
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+# Per-process reader, opened once by the pool initializer
+_reader = None
+
+
+def open_reader(pdf):
+    """
+    PdfReader over a file path or in-memory PDF bytes (bytes, bytearray, memoryview).
+    bytes are wrapped in BytesIO, which shares the immutable buffer instead of copying
+    it; a bytearray or memoryview is copied once by BytesIO.
+    Paths are memory-mapped (pypdf would otherwise read the whole file into memory);
+    forked workers mapping the same file share its pages through the OS page cache.
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return PdfReader(io.BytesIO(pdf))
+    with open(pdf, "rb") as f:
+        return PdfReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _source_name(pdf):
+    return pdf if isinstance(pdf, str) else "<memory>"
+
+
+def _init_worker(pdf):
+    global _reader
+    _reader = open_reader(pdf)
+
+
+def _extract_pages(reader, start, end):
+    return [(n, reader.pages[n].extract_text() or "") for n in range(start, end)]
+
+
+def _extract_range(start, end):
+    """Extract text for pages [start, end) with this worker's reader."""
+    return _extract_pages(_reader, start, end)
+
+
+def count_pages(pdf):
+    return len(open_reader(pdf).pages)
+
+
+def iter_pages(pdf, workers=2, pages_per_task=8, max_pages_in_memory=64):
+    """
+    Yield one Document per page of pdf (a path or PDF bytes), in page order,
+    as soon as it is parsed. Page ranges are extracted on a process pool; at most
+    max_pages_in_memory pages are parsed ahead of the consumer, so memory does not
+    grow with page count. Forked workers inherit in-memory bytes without a copy.
+    Metadata matches PyPDFLoader ({"source": path, "page": 0-based index}).
+    """
+    total = count_pages(pdf)
+    source = _source_name(pdf)
+    ranges = [(i, min(i + pages_per_task, total)) for i in range(0, total, pages_per_task)]
+
+    if workers <= 1 or len(ranges) <= 1:
+        # Own reader: the module-level one is per pool worker, and concurrent jobs
+        # parse in threads of this same process
+        reader = open_reader(pdf)
+        for start, end in ranges:
+            for n, text in _extract_pages(reader, start, end):
+                yield Document(page_content=text, metadata={"source": source, "page": n})
+        return
+
+    max_tasks = max(1, max_pages_in_memory // pages_per_task)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf,)) as pool:
+        pending = deque()
+        ranges = iter(ranges)
+        while True:
+            while len(pending) < max_tasks:
+                page_range = next(ranges, None)
+                if page_range is None:
+                    break
+                pending.append(pool.submit(_extract_range, *page_range))
+            if not pending:
+                return
+            for n, text in pending.popleft().result():
+                yield Document(page_content=text, metadata={"source": source, "page": n})
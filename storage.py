@@ -0,0 +1,299 @@
+# storage.py
+import io
+import os
+import json
+import hashlib
+import threading
+import uuid
+from urllib.parse import quote
+from config import STORAGE_BACKEND, LOCAL_STORAGE_DIR
+
+
+def _blocks(pdf, size=1024 * 1024):
+    """Bytes or a readable binary stream (e.g. Streamlit's UploadedFile), block by block from the start."""
+    stream = io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray, memoryview)) else pdf
+    stream.seek(0)
+    return iter(lambda: stream.read(size), b"")
+
+
+def _new_file_id():
+    # Unique per upload, like Drive's: a deleted file's ID never names a later upload of the same name
+    return uuid.uuid4().hex
+
+
+class StorageBackend:
+    """
+    Where uploaded PDFs live. Files are kept per user and addressed by an opaque
+    file ID; metadata is a dict with id, name, size, md5Checksum and webViewLink
+    (Drive's field names, which pdf_history already stores).
+    """
+    name = None
+    # Whether the user must connect an account (OAuth) before files can be stored
+    requires_oauth = False
+
+    def is_connected(self, username):
+        return True
+
+    def put(self, username, pdf_name, pdf, on_progress=None):
+        """Store a new PDF (bytes or file object). A file of that name already stored is returned as is."""
+        raise NotImplementedError
+
+    def replace(self, username, file_id, pdf, on_progress=None):
+        """Overwrite a stored PDF's content, keeping its file ID."""
+        raise NotImplementedError
+
+    def get(self, username, file_id):
+        """The PDF's bytes."""
+        raise NotImplementedError
+
+    def list(self, username):
+        raise NotImplementedError
+
+    def delete(self, username, file_id):
+        raise NotImplementedError
+
+    def delete_many(self, username, file_ids):
+        """Delete several files; returns {file_id: error} for those that could not be deleted."""
+        errors = {}
+        for file_id in file_ids:
+            try:
+                self.delete(username, file_id)
+            except Exception as e:
+                errors[file_id] = e
+        return errors
+
+    def stat(self, username, file_id):
+        """Metadata of a stored file, or None."""
+        raise NotImplementedError
+
+    def remove_user(self, username):
+        """Remove whatever is left of a user's storage (after their files are deleted)."""
+
+    def release(self, username):
+        """Drop per-user handles held in this process (logout, account deletion)."""
+
+
+class DriveStorage(StorageBackend):
+    """A Google Drive folder per user, through gdrive_utils and its caches."""
+    name = "drive"
+    requires_oauth = True
+
+    def _service(self, username):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        from gdrive_utils import get_drive_service, cached_drive_service
+        if get_script_run_ctx() is not None:
+            return get_drive_service()
+        # Background job threads have no session (and no OAuth flow): use the stored credentials
+        import db
+        creds_info = db.get_google_creds(username)
+        service = cached_drive_service(username, creds_info) if creds_info else None
+        if service is None:
+            raise RuntimeError(f"Google Drive is not connected for {username}.")
+        return service
+
+    def is_connected(self, username):
+        import streamlit as st
+        import db
+        if "google_creds" in st.session_state:
+            return True
+        google_creds = db.get_google_creds(username)
+        if google_creds:
+            st.session_state["google_creds"] = google_creds
+            return True
+        return False
+
+    def put(self, username, pdf_name, pdf, on_progress=None):
+        from gdrive_utils import upload_pdf_to_drive
+        return upload_pdf_to_drive(self._service(username), pdf_name, pdf, username=username, on_progress=on_progress)
+
+    def replace(self, username, file_id, pdf, on_progress=None):
+        from gdrive_utils import replace_pdf_in_drive
+        return replace_pdf_in_drive(self._service(username), file_id, pdf, username=username, on_progress=on_progress)
+
+    def get(self, username, file_id):
+        from gdrive_utils import fetch_pdf_to_cache
+        from blob_cache import get_blob_cache
+        pdf_file = get_blob_cache().open(fetch_pdf_to_cache(self._service(username), file_id, username))
+        if pdf_file is None:
+            raise FileNotFoundError("evicted from the local cache; please try again")
+        # Served from the page cache; this is the only full read
+        with pdf_file:
+            return pdf_file[:]
+
+    def list(self, username):
+        from gdrive_utils import list_user_files
+        return list_user_files(self._service(username), username)
+
+    def delete(self, username, file_id):
+        from gdrive_utils import delete_pdf_from_drive
+        delete_pdf_from_drive(self._service(username), file_id, username=username)
+
+    def delete_many(self, username, file_ids):
+        # Batch HTTP requests, with a single ownership check for all of them
+        from gdrive_utils import delete_files
+        return delete_files(self._service(username), file_ids, username=username)
+
+    def stat(self, username, file_id):
+        from gdrive_utils import get_user_file_index
+        return get_user_file_index(self._service(username), username).get(file_id)
+
+    def remove_user(self, username):
+        from gdrive_utils import get_or_create_user_folder, invalidate_drive_metadata
+        drive_service = self._service(username)
+        drive_service.files().delete(fileId=get_or_create_user_folder(drive_service, username)).execute()
+        invalidate_drive_metadata(username)
+
+    def release(self, username):
+        from gdrive_utils import invalidate_drive_service
+        invalidate_drive_service(username)
+
+
+class LocalStorage(StorageBackend):
+    """
+    A directory per user on this host: <root>/<username>/<file_id>.pdf with a JSON
+    metadata file next to it. Writes go to a temp file that is renamed into place.
+    """
+    name = "local"
+
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, username):
+        # Quoted, so a username can never name a path outside the root
+        return os.path.join(self.root, quote(username, safe=""))
+
+    def _path(self, username, file_id, ext=".pdf"):
+        return os.path.join(self._dir(username), f"{file_id}{ext}")
+
+    def _write(self, username, file_id, pdf_name, pdf, on_progress=None):
+        os.makedirs(self._dir(username), exist_ok=True)
+        tmp_path = self._path(username, file_id, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        md5 = hashlib.md5()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for block in _blocks(pdf):
+                md5.update(block)
+                f.write(block)
+                size += len(block)
+        os.replace(tmp_path, self._path(username, file_id))
+        meta = {"id": file_id, "name": pdf_name, "size": size, "md5Checksum": md5.hexdigest(), "webViewLink": ""}
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(username, file_id, ".json"))
+        if on_progress:
+            on_progress(1.0)
+        return meta
+
+    def put(self, username, pdf_name, pdf, on_progress=None):
+        existing = next((meta for meta in self.list(username) if meta["name"] == pdf_name), None)
+        return existing or self._write(username, _new_file_id(), pdf_name, pdf, on_progress)
+
+    def replace(self, username, file_id, pdf, on_progress=None):
+        meta = self.stat(username, file_id)
+        if meta is None:
+            raise FileNotFoundError("File not found in user's folder.")
+        return self._write(username, file_id, meta["name"], pdf, on_progress)
+
+    def get(self, username, file_id):
+        with open(self._path(username, file_id), "rb") as f:
+            return f.read()
+
+    def list(self, username):
+        try:
+            names = os.listdir(self._dir(username))
+        except FileNotFoundError:
+            return []
+        return [m for m in (self.stat(username, n[:-5]) for n in names if n.endswith(".json")) if m]
+
+    def delete(self, username, file_id):
+        if self.stat(username, file_id) is None:
+            raise FileNotFoundError("File not found in user's folder.")
+        os.remove(self._path(username, file_id, ".json"))
+        os.remove(self._path(username, file_id))
+
+    def stat(self, username, file_id):
+        try:
+            with open(self._path(username, file_id, ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # A metadata file cut short by a crash (before writes were atomic) counts as missing
+            return None
+
+    def remove_user(self, username):
+        import shutil
+        shutil.rmtree(self._dir(username), ignore_errors=True)
+
+
+class MemoryStorage(StorageBackend):
+    """Process memory only; for tests and offline benchmarks of the upload-index-chat path."""
+    name = "memory"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}  # username -> {file_id: (metadata, bytes)}
+
+    def _store(self, username, file_id, pdf_name, pdf, on_progress=None):
+        data = b"".join(_blocks(pdf))
+        meta = {"id": file_id, "name": pdf_name, "size": len(data),
+                "md5Checksum": hashlib.md5(data).hexdigest(), "webViewLink": ""}
+        with self.lock:
+            self.files.setdefault(username, {})[file_id] = (meta, data)
+        if on_progress:
+            on_progress(1.0)
+        return dict(meta)
+
+    def put(self, username, pdf_name, pdf, on_progress=None):
+        existing = next((meta for meta in self.list(username) if meta["name"] == pdf_name), None)
+        return existing or self._store(username, _new_file_id(), pdf_name, pdf, on_progress)
+
+    def replace(self, username, file_id, pdf, on_progress=None):
+        meta = self.stat(username, file_id)
+        if meta is None:
+            raise FileNotFoundError("File not found in user's folder.")
+        return self._store(username, file_id, meta["name"], pdf, on_progress)
+
+    def get(self, username, file_id):
+        with self.lock:
+            entry = self.files.get(username, {}).get(file_id)
+        if entry is None:
+            raise FileNotFoundError("File not found in user's folder.")
+        return entry[1]
+
+    def list(self, username):
+        with self.lock:
+            return [dict(meta) for meta, _ in self.files.get(username, {}).values()]
+
+    def delete(self, username, file_id):
+        with self.lock:
+            if self.files.get(username, {}).pop(file_id, None) is None:
+                raise FileNotFoundError("File not found in user's folder.")
+
+    def stat(self, username, file_id):
+        with self.lock:
+            entry = self.files.get(username, {}).get(file_id)
+        return dict(entry[0]) if entry else None
+
+    def remove_user(self, username):
+        with self.lock:
+            self.files.pop(username, None)
+
+
+BACKENDS = {
+    "drive": DriveStorage,
+    "local": lambda: LocalStorage(LOCAL_STORAGE_DIR),
+    "memory": MemoryStorage,
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """The configured document storage (STORAGE_BACKEND), shared by every session in the process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}'; expected one of {', '.join(BACKENDS)}")
+            _storage = BACKENDS[STORAGE_BACKEND]()
+        return _storage
@@ -0,0 +1,47 @@
+# tests/conftest.py
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads st.secrets at import time; the tested modules only need these values
+_config = types.ModuleType("config")
+_config.__dict__.update(
+    STORAGE_BACKEND="memory",
+    LOCAL_STORAGE_DIR="data/pdfs",
+    BLOB_CACHE_DIR=".cache/blobs",
+    BLOB_CACHE_MAX_MB=2048,
+    WRITE_BUFFER_FLUSH_SECONDS=1.0,
+    WRITE_BUFFER_MAX_PENDING=200,
+    MONGO_URI="mongodb://localhost:27017",
+    MONGO_DB_NAME="pdfbot_test",
+    MONGO_MAX_POOL_SIZE=5,
+    MONGO_MIN_POOL_SIZE=0,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS=1000,
+    MONGO_CONNECT_TIMEOUT_MS=1000,
+    MONGO_SOCKET_TIMEOUT_MS=1000,
+    CHAT_PAGE_SIZE=20,
+    QDRANT_URL="http://localhost:6333",
+    QDRANT_API_KEY="test",
+    GOOGLE_API_KEY="test",
+    COLLECTION_NAME="default_collection",
+    QDRANT_STORAGE_MODE="per_document",
+    MULTI_TENANT_COLLECTION="pdfbot_chunks",
+    QDRANT_COLLECTION_PROFILE="float32",
+    QDRANT_HNSW_M=None,
+    QDRANT_HNSW_EF_CONSTRUCT=None,
+    QDRANT_RESCORE_OVERSAMPLING=None,
+    EMBEDDING_OUTPUT_DIM=None,
+    EMBED_WORKERS=4,
+    EMBED_REQUESTS_PER_MINUTE=100,
+    EMBED_MAX_RETRIES=5,
+    EMBED_CACHE_PATH=".cache/embeddings.sqlite3",
+    EMBED_CACHE_MAX_MB=512,
+    VECTOR_STORE_CACHE_SIZE=128,
+    VECTOR_STORE_TTL_SECONDS=1800,
+    PARSE_WORKERS=2,
+    PARSE_PAGES_PER_TASK=8,
+    PARSE_MAX_PAGES_IN_MEMORY=64,
+)
+sys.modules.setdefault("config", _config)
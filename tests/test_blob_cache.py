@@ -0,0 +1,84 @@
+# tests/test_blob_cache.py
+import io
+import os
+import hashlib
+import pytest
+from blob_cache import BlobCache
+
+
+def _blob(char):
+    return char.encode() * 100
+
+
+def _tmp_files(root):
+    return [name for _, _, files in os.walk(root) for name in files if name.endswith(".tmp")]
+
+
+def test_put_returns_content_hash_and_open_maps_it(tmp_path):
+    cache = BlobCache(str(tmp_path), 10_000)
+    digest = cache.put(_blob("a"))
+    assert digest == hashlib.sha256(_blob("a")).hexdigest()
+    with cache.open(digest) as mapped:
+        assert mapped[:] == _blob("a")
+    assert cache.open("0" * 64) is None
+
+
+def test_put_accepts_streams(tmp_path):
+    cache = BlobCache(str(tmp_path), 10_000)
+    assert cache.put(io.BytesIO(_blob("a"))) == cache.put(_blob("a"))
+    # Identical content is stored and counted once
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 100
+
+
+def test_aliases_are_per_revision(tmp_path):
+    cache = BlobCache(str(tmp_path), 10_000)
+    old = cache.put(_blob("a"), file_id="f1", revision="md5-a")
+    new = cache.put(_blob("b"), file_id="f1", revision="md5-b")
+    assert cache.lookup("f1", "md5-a") == old
+    assert cache.lookup("f1", "md5-b") == new
+    assert cache.lookup("f1", "md5-c") is None
+    assert cache.lookup("f2", "md5-a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+def test_evicts_least_recently_used_to_ninety_percent(tmp_path):
+    cache = BlobCache(str(tmp_path), 250)
+    a = cache.put(_blob("a"), file_id="fa", revision="1")
+    b = cache.put(_blob("b"), file_id="fb", revision="1")
+    cache.open(a).close()  # a is now more recently used than b
+    c = cache.put(_blob("c"), file_id="fc", revision="1")
+    # 300 bytes > 250: evict the LRU blob until under 225
+    assert cache.stats()["bytes"] == 200
+    assert cache.open(b) is None
+    assert not os.path.exists(cache.path(b))
+    assert cache.lookup("fb", "1") is None
+    assert cache.lookup("fa", "1") == a
+    assert cache.lookup("fc", "1") == c
+
+
+def test_newly_stored_blob_is_never_evicted(tmp_path):
+    cache = BlobCache(str(tmp_path), 50)
+    digest = cache.put(_blob("a"))
+    with cache.open(digest) as mapped:
+        assert mapped[:] == _blob("a")
+
+
+def test_index_survives_reopen(tmp_path):
+    digest = BlobCache(str(tmp_path), 10_000).put(_blob("a"), file_id="f1", revision="1")
+    reopened = BlobCache(str(tmp_path), 10_000)
+    assert reopened.lookup("f1", "1") == digest
+    assert reopened.stats()["bytes"] == 100
+
+
+def test_failed_put_leaves_no_temp_file(tmp_path):
+    class Failing(io.RawIOBase):
+        def read(self, size=-1):
+            raise OSError("connection reset")
+
+    cache = BlobCache(str(tmp_path), 10_000)
+    with pytest.raises(OSError):
+        cache.put(Failing())
+    assert _tmp_files(tmp_path) == []
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,76 @@
+# tests/test_doc_registry.py
+import pytest
+
+pytest.importorskip("pymongo")
+mongomock = pytest.importorskip("mongomock")
+import doc_registry
+from doc_registry import (acquire_document, release_document, mark_document_ready, get_document,
+                          shared_collection_name, fingerprint_pdf)
+
+FP = "f" * 64
+OTHER_FP = "e" * 64
+
+
+@pytest.fixture(autouse=True)
+def documents(monkeypatch):
+    col = mongomock.MongoClient().db.documents
+    monkeypatch.setattr(doc_registry, "documents_col", col)
+    return col
+
+
+def test_fingerprint_matches_for_bytes_and_path(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    assert fingerprint_pdf(b"%PDF-1.4") == fingerprint_pdf(str(path))
+
+
+def test_acquire_shares_one_collection_until_ready():
+    assert acquire_document(FP, "alice__a.pdf") == (shared_collection_name(FP), True)
+    assert acquire_document(FP, "bob__a.pdf") == (shared_collection_name(FP), True)
+    mark_document_ready(FP)
+    assert acquire_document(FP, "carol__a.pdf") == (shared_collection_name(FP), False)
+    assert get_document(FP)["refs"] == ["alice__a.pdf", "bob__a.pdf", "carol__a.pdf"]
+
+
+def test_acquiring_twice_counts_once():
+    acquire_document(FP, "alice__a.pdf")
+    acquire_document(FP, "alice__a.pdf")
+    acquire_document(FP, "bob__a.pdf")
+    assert release_document("alice__a.pdf") is None
+    assert release_document("bob__a.pdf") == shared_collection_name(FP)
+
+
+def test_only_the_last_release_returns_the_collection():
+    acquire_document(FP, "alice__a.pdf")
+    acquire_document(FP, "bob__a.pdf")
+    assert release_document("bob__a.pdf") is None
+    assert get_document(FP)["refs"] == ["alice__a.pdf"]
+    assert release_document("alice__a.pdf") == shared_collection_name(FP)
+    assert get_document(FP) is None
+
+
+def test_unregistered_ref_is_a_legacy_collection():
+    assert release_document("alice__legacy.pdf") == "alice__legacy.pdf"
+
+
+def test_release_by_fingerprint_leaves_newer_upload_alone():
+    acquire_document(OTHER_FP, "alice__a.pdf")
+    acquire_document(FP, "alice__a.pdf")
+    assert release_document("alice__a.pdf", OTHER_FP) == shared_collection_name(OTHER_FP)
+    assert get_document(FP)["refs"] == ["alice__a.pdf"]
+    # A repeated (retried) release finds nothing left to drop
+    assert release_document("alice__a.pdf", OTHER_FP) is None
+
+
+def test_release_does_not_delete_a_document_reacquired_meanwhile(documents, monkeypatch):
+    acquire_document(FP, "alice__a.pdf")
+    delete_one = documents.delete_one
+
+    def reacquired_first(query):
+        # Another session uploads the same bytes between the $pull and the delete
+        acquire_document(FP, "bob__a.pdf")
+        return delete_one(query)
+
+    monkeypatch.setattr(documents, "delete_one", reacquired_first)
+    assert release_document("alice__a.pdf") is None
+    assert get_document(FP)["refs"] == ["bob__a.pdf"]
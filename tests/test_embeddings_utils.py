@@ -0,0 +1,155 @@
+# tests/test_embeddings_utils.py
+import time
+import random
+import threading
+from types import SimpleNamespace
+import pytest
+
+for module in ("streamlit", "qdrant_client", "langchain_qdrant", "langchain_google_genai"):
+    pytest.importorskip(module)
+from langchain_core.documents import Document
+import embeddings_utils
+from embeddings_utils import TokenBucket, embed_batches
+
+
+def test_token_bucket_allows_a_burst_then_paces_to_the_rate():
+    bucket = TokenBucket(600, capacity=3)  # 10 tokens per second
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.18
+
+
+def test_token_bucket_is_shared_by_threads():
+    bucket = TokenBucket(1200, capacity=1)  # 20 tokens per second
+    started = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # One token up front, then the other four at 50 ms intervals
+    assert time.monotonic() - started >= 0.19
+
+
+def _batches(count):
+    return [[Document(page_content=f"chunk {i}")] for i in range(count)]
+
+
+def test_embed_batches_yields_in_input_order(monkeypatch):
+    def slow_embed(model, texts):
+        time.sleep(random.uniform(0, 0.02))
+        return [[float(text.split()[1])] for text in texts]
+
+    monkeypatch.setattr(embeddings_utils, "embed_texts_cached", slow_embed)
+    results = list(embed_batches(None, _batches(30), workers=4))
+    assert [batch[0].page_content for batch, _ in results] == [f"chunk {i}" for i in range(30)]
+    assert [vectors for _, vectors in results] == [[[float(i)]] for i in range(30)]
+
+
+def test_embed_batches_bounds_batches_in_flight(monkeypatch):
+    monkeypatch.setattr(embeddings_utils, "embed_texts_cached", lambda model, texts: [[0.0]])
+    pulled = []
+
+    def source():
+        for i, batch in enumerate(_batches(50)):
+            pulled.append(i)
+            yield batch
+
+    for consumed, _ in enumerate(embed_batches(None, source(), workers=2), start=1):
+        # Never more than 2 * workers batches read ahead of the consumer
+        assert len(pulled) - consumed <= 4
+
+
+def test_embed_batches_raises_the_failing_batch_error(monkeypatch):
+    def embed(model, texts):
+        if texts == ["chunk 3"]:
+            raise RuntimeError("quota")
+        return [[0.0]]
+
+    monkeypatch.setattr(embeddings_utils, "embed_texts_cached", embed)
+    seen = []
+    with pytest.raises(RuntimeError):
+        for batch, _ in embed_batches(None, _batches(10), workers=2):
+            seen.append(batch[0].page_content)
+    assert seen == ["chunk 0", "chunk 1", "chunk 2"]
+
+
+class FakeQdrant:
+    """Serves scroll() from a fixed point list, two pages at a time, and records writes."""
+
+    def __init__(self, points):
+        self.points = points
+        self.payload_updates = []
+        self.deleted = []
+
+    def scroll(self, collection_name, scroll_filter, limit, offset, with_payload, with_vectors):
+        start = offset or 0
+        page = self.points[start:start + 2]
+        return page, (start + 2 if start + 2 < len(self.points) else None)
+
+    def batch_update_points(self, collection_name, update_operations, wait):
+        self.payload_updates.extend(update_operations)
+
+    def delete(self, collection_name, points_selector, wait):
+        self.deleted.extend(points_selector.points)
+
+
+def _point(point_id, page, chunk_id, text):
+    return SimpleNamespace(id=point_id, payload={"metadata": {
+        "page_hash": f"page of {text}", "chunk_hash": text, "page": page, "chunk_id": chunk_id}})
+
+
+def _chunk(page, chunk_id, text):
+    return Document(page_content=text, metadata={
+        "page_hash": f"page of {text}", "chunk_hash": text, "page": page, "chunk_id": chunk_id})
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    """Replaces index_documents; records the chunks sync_documents sends for embedding."""
+    added = []
+
+    def index_documents(qdrant, model, collection_name, docs, on_progress=None, owner=None):
+        added.extend(docs)
+        return len(added)
+
+    monkeypatch.setattr(embeddings_utils, "index_documents", index_documents)
+    return added
+
+
+def test_sync_documents_embeds_only_new_chunks_and_deletes_removed_ones(indexed):
+    qdrant = FakeQdrant([_point("a", 0, 0, "A"), _point("b", 1, 1, "B"), _point("c", 2, 2, "C")])
+    docs = [_chunk(0, 0, "A"), _chunk(1, 1, "B"), _chunk(2, 2, "new")]
+    assert embeddings_utils.sync_documents(qdrant, None, "idx", iter(docs)) == (1, 1, 2)
+    assert [d.page_content for d in indexed] == ["new"]
+    assert qdrant.deleted == ["c"]
+    assert qdrant.payload_updates == []
+
+
+def test_sync_documents_updates_position_of_moved_chunks(indexed):
+    # A page inserted at the front shifts every kept chunk by one page and one chunk_id
+    qdrant = FakeQdrant([_point("a", 0, 0, "A"), _point("b", 1, 1, "B")])
+    docs = [_chunk(0, 0, "X"), _chunk(1, 1, "A"), _chunk(2, 2, "B")]
+    assert embeddings_utils.sync_documents(qdrant, None, "idx", iter(docs)) == (1, 0, 2)
+    updates = {op.set_payload.points[0]: op.set_payload for op in qdrant.payload_updates}
+    assert set(updates) == {"a", "b"}
+    assert updates["a"].payload == {"page": 1, "chunk_id": 1}
+    assert updates["b"].payload == {"page": 2, "chunk_id": 2}
+    assert all(update.key == "metadata" for update in updates.values())
+
+
+def test_sync_documents_matches_repeated_chunks_one_to_one(indexed):
+    # The same chunk text twice on a page: one copy removed in the revision
+    qdrant = FakeQdrant([_point("d1", 0, 0, "D"), _point("d2", 0, 1, "D"), _point("e", 0, 2, "E")])
+    docs = [_chunk(0, 0, "D"), _chunk(0, 1, "E")]
+    added, deleted, kept = embeddings_utils.sync_documents(qdrant, None, "idx", iter(docs))
+    assert (added, deleted, kept) == (0, 1, 2)
+    assert len(qdrant.deleted) == 1 and qdrant.deleted[0] in ("d1", "d2")
+    moved = {op.set_payload.points[0]: op.set_payload.payload for op in qdrant.payload_updates}
+    assert moved.get("e") == {"page": 0, "chunk_id": 1}
+    kept_d = {"d1", "d2"} - set(qdrant.deleted)
+    assert moved.get(kept_d.pop(), {"page": 0, "chunk_id": 0}) == {"page": 0, "chunk_id": 0}
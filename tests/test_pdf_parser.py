@@ -0,0 +1,72 @@
+# tests/test_pdf_parser.py
+import io
+import threading
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from pdf_parser import count_pages, iter_pages
+
+
+def _make_pdf(label, pages):
+    """PDF bytes whose page n reads "<label> page <n>"."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for n in range(pages):
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)}),
+        })
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td ({label} page {n}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _texts(pdf, **kwargs):
+    return [(d.metadata["page"], d.page_content.strip()) for d in iter_pages(pdf, **kwargs)]
+
+
+def test_pages_come_back_in_order_with_metadata(tmp_path):
+    pdf = _make_pdf("A", 5)
+    path = tmp_path / "a.pdf"
+    path.write_bytes(pdf)
+    assert count_pages(pdf) == 5
+    expected = [(n, f"A page {n}") for n in range(5)]
+    assert _texts(pdf, workers=1) == expected
+    docs = list(iter_pages(str(path), workers=1))
+    assert [d.metadata for d in docs] == [{"source": str(path), "page": n} for n in range(5)]
+
+
+def test_process_pool_keeps_page_order():
+    pdf = _make_pdf("A", 20)
+    assert _texts(pdf, workers=2, pages_per_task=3, max_pages_in_memory=6) == \
+        [(n, f"A page {n}") for n in range(20)]
+
+
+def test_concurrent_serial_parses_do_not_share_a_reader():
+    # Ingest jobs parse small PDFs in-process from several threads at once
+    pdfs = {label: _make_pdf(label, 8) for label in ("A", "B", "C", "D")}
+    results, errors = {label: [] for label in pdfs}, []
+    start = threading.Barrier(len(pdfs))
+
+    def parse(label):
+        try:
+            start.wait()
+            for _ in range(10):
+                results[label].extend(_texts(pdfs[label], workers=2, pages_per_task=8))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=parse, args=(label,)) for label in pdfs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    for label, texts in results.items():
+        assert texts == [(n, f"{label} page {n}") for n in range(8)] * 10
@@ -0,0 +1,112 @@
+# tests/test_storage.py
+import io
+import os
+import hashlib
+import pytest
+from storage import LocalStorage, MemoryStorage
+
+PDF = b"%PDF-1.4 first revision"
+REVISED = b"%PDF-1.4 second, longer revision"
+
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path))
+    return MemoryStorage()
+
+
+def test_put_get_stat(storage):
+    meta = storage.put("alice", "a.pdf", PDF)
+    assert meta["name"] == "a.pdf"
+    assert meta["size"] == len(PDF)
+    assert meta["md5Checksum"] == hashlib.md5(PDF).hexdigest()
+    assert storage.get("alice", meta["id"]) == PDF
+    assert storage.stat("alice", meta["id"]) == meta
+
+
+def test_put_accepts_file_objects_and_reports_progress(storage):
+    progress = []
+    stream = io.BytesIO(PDF)
+    stream.read()  # put reads from the start regardless of the position
+    meta = storage.put("alice", "a.pdf", stream, on_progress=progress.append)
+    assert storage.get("alice", meta["id"]) == PDF
+    assert progress[-1] == 1.0
+
+
+def test_put_same_name_returns_existing_file(storage):
+    first = storage.put("alice", "a.pdf", PDF)
+    second = storage.put("alice", "a.pdf", REVISED)
+    assert second["id"] == first["id"]
+    assert storage.get("alice", first["id"]) == PDF
+
+
+def test_file_ids_are_unique_per_upload(storage):
+    first = storage.put("alice", "a.pdf", PDF)
+    storage.delete("alice", first["id"])
+    second = storage.put("alice", "a.pdf", PDF)
+    assert second["id"] != first["id"]
+
+
+def test_list_is_per_user(storage):
+    a = storage.put("alice", "a.pdf", PDF)
+    b = storage.put("alice", "b.pdf", REVISED)
+    storage.put("bob", "a.pdf", PDF)
+    assert sorted(m["id"] for m in storage.list("alice")) == sorted([a["id"], b["id"]])
+    assert storage.list("carol") == []
+
+
+def test_replace_keeps_id_and_name(storage):
+    meta = storage.put("alice", "a.pdf", PDF)
+    updated = storage.replace("alice", meta["id"], REVISED)
+    assert updated["id"] == meta["id"]
+    assert updated["name"] == "a.pdf"
+    assert updated["size"] == len(REVISED)
+    assert storage.get("alice", meta["id"]) == REVISED
+
+
+def test_replace_missing_file_raises(storage):
+    with pytest.raises(FileNotFoundError):
+        storage.replace("alice", "missing", PDF)
+
+
+def test_delete(storage):
+    meta = storage.put("alice", "a.pdf", PDF)
+    storage.delete("alice", meta["id"])
+    assert storage.stat("alice", meta["id"]) is None
+    assert storage.list("alice") == []
+    with pytest.raises(FileNotFoundError):
+        storage.get("alice", meta["id"])
+    with pytest.raises(FileNotFoundError):
+        storage.delete("alice", meta["id"])
+
+
+def test_delete_many_reports_failures(storage):
+    a = storage.put("alice", "a.pdf", PDF)
+    b = storage.put("alice", "b.pdf", PDF)
+    errors = storage.delete_many("alice", [a["id"], "missing", b["id"]])
+    assert list(errors) == ["missing"]
+    assert storage.list("alice") == []
+
+
+def test_remove_user(storage):
+    storage.put("alice", "a.pdf", PDF)
+    storage.remove_user("alice")
+    assert storage.list("alice") == []
+
+
+def test_local_truncated_metadata_counts_as_missing(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    meta = storage.put("alice", "a.pdf", PDF)
+    with open(storage._path("alice", meta["id"], ".json"), "w") as f:
+        f.write('{"id": "')
+    assert storage.stat("alice", meta["id"]) is None
+    assert storage.list("alice") == []
+
+
+def test_local_usernames_stay_under_root(tmp_path):
+    root = tmp_path / "root"
+    storage = LocalStorage(str(root))
+    storage.put("../escape", "a.pdf", PDF)
+    assert not os.path.exists(tmp_path / "escape")
+    assert len(os.listdir(root)) == 1
@@ -0,0 +1,136 @@
+# tests/test_write_behind.py
+import pytest
+
+pytest.importorskip("pymongo")
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import write_behind
+from write_behind import WriteBehindBuffer
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+        self.updates = []
+        self.fail_with = None
+
+    def insert_many(self, docs, ordered=True):
+        if self.fail_with:
+            raise self.fail_with
+        assert ordered is False
+        self.inserted.extend(docs)
+
+    def bulk_write(self, ops, ordered=True):
+        if self.fail_with:
+            raise self.fail_with
+        self.updates.extend(ops)
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    messages, users = FakeCollection(), FakeCollection()
+    monkeypatch.setattr(write_behind.db, "messages_collection", lambda: messages)
+    monkeypatch.setattr(write_behind.db, "users_collection", lambda: users)
+    return messages, users
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = WriteBehindBuffer(flush_seconds=3600, max_pending=1000)
+    # No background thread or atexit hook; tests flush explicitly
+    monkeypatch.setattr(buffer, "_start", lambda: None)
+    return buffer
+
+
+def _message(username, pdf_name, text):
+    return {"username": username, "pdf_name": pdf_name, "user": text, "bot": ""}
+
+
+def test_state_updates_for_a_user_coalesce(buffer, collections):
+    _, users = collections
+    buffer.set_state("alice", selected_pdf="a.pdf", user_collections=["x"])
+    buffer.set_state("alice", selected_pdf="b.pdf")
+    buffer.set_state("bob", selected_pdf="c.pdf")
+    buffer.flush()
+    assert users.updates == [
+        UpdateOne({"username": "alice"}, {"$set": {"selected_pdf": "b.pdf", "user_collections": ["x"]}}),
+        UpdateOne({"username": "bob"}, {"$set": {"selected_pdf": "c.pdf"}}),
+    ]
+
+
+def test_flush_writes_messages_in_order_and_empties_buffer(buffer, collections):
+    messages, users = collections
+    buffer.add_message(_message("alice", "a.pdf", "1"))
+    buffer.add_message(_message("alice", "a.pdf", "2"))
+    buffer.flush()
+    assert [m["user"] for m in messages.inserted] == ["1", "2"]
+    assert not buffer.has_pending("alice")
+    buffer.flush()
+    assert len(messages.inserted) == 2
+    assert users.updates == []
+
+
+def test_discard_one_pdf_keeps_other_messages_and_state(buffer, collections):
+    messages, users = collections
+    buffer.add_message(_message("alice", "a.pdf", "drop"))
+    buffer.add_message(_message("alice", "b.pdf", "keep"))
+    buffer.add_message(_message("bob", "a.pdf", "keep too"))
+    buffer.set_state("alice", selected_pdf="b.pdf")
+    buffer.discard("alice", "a.pdf")
+    buffer.flush()
+    assert [m["user"] for m in messages.inserted] == ["keep", "keep too"]
+    assert len(users.updates) == 1
+
+
+def test_discard_user_drops_messages_and_state(buffer, collections):
+    messages, users = collections
+    buffer.add_message(_message("alice", "a.pdf", "drop"))
+    buffer.set_state("alice", selected_pdf="a.pdf")
+    buffer.set_state("bob", selected_pdf="b.pdf")
+    buffer.discard("alice")
+    assert not buffer.has_pending("alice")
+    buffer.flush()
+    assert messages.inserted == []
+    assert users.updates == [UpdateOne({"username": "bob"}, {"$set": {"selected_pdf": "b.pdf"}})]
+
+
+def test_state_writes_never_upsert(buffer, collections):
+    _, users = collections
+    buffer.set_state("deleted-user", selected_pdf="a.pdf")
+    buffer.flush()
+    assert [op._upsert for op in users.updates] == [None]
+
+
+def test_failed_flush_requeues_and_newer_state_wins(buffer, collections):
+    messages, users = collections
+    buffer.add_message(_message("alice", "a.pdf", "1"))
+    buffer.set_state("alice", selected_pdf="a.pdf", pdf_history=[])
+    messages.fail_with = ConnectionError("down")
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    assert buffer.has_pending("alice")
+
+    buffer.set_state("alice", selected_pdf="b.pdf")
+    messages.fail_with = None
+    buffer.flush()
+    assert [m["user"] for m in messages.inserted] == ["1"]
+    assert users.updates == [
+        UpdateOne({"username": "alice"}, {"$set": {"selected_pdf": "b.pdf", "pdf_history": []}}),
+    ]
+
+
+def test_duplicate_keys_from_an_earlier_partial_flush_are_ignored(buffer, collections):
+    messages, _ = collections
+    buffer.add_message(_message("alice", "a.pdf", "1"))
+    messages.fail_with = BulkWriteError({"writeErrors": [{"code": 11000, "index": 0}]})
+    buffer.flush()
+    assert not buffer.has_pending("alice")
+
+
+def test_other_bulk_write_errors_are_requeued(buffer, collections):
+    messages, _ = collections
+    buffer.add_message(_message("alice", "a.pdf", "1"))
+    messages.fail_with = BulkWriteError({"writeErrors": [{"code": 121, "index": 0}]})
+    with pytest.raises(BulkWriteError):
+        buffer.flush()
+    assert buffer.has_pending("alice")
@@ -3,35 +3,33 @@
 import streamlit as st
 import time
 import base64
-from pymongo import MongoClient
-from config import MONGO_URI
-from gdrive_utils import get_drive_service, upload_pdf_to_drive, download_pdf_from_drive
-client = MongoClient(MONGO_URI)
-db = client["pdfbot"]
-chats_col = db["users"]
+from storage import get_storage
+import db
+import write_behind
 
 
 
 def save_user_chats():
-    """Save the current user's chat history + collections to MongoDB."""
+    """Queue the current user's collections + PDF history for the background MongoDB writer."""
     if "username" in st.session_state:
-        username = st.session_state["username"]
-        data = {
-            "username": username,
-            "pdf_chats": st.session_state.get("pdf_chats", {}),
-            "user_collections": st.session_state.get("user_collections", []),
-            "pdf_history": st.session_state.get("pdf_history", [])
-        }
-        chats_col.update_one({"username": username}, {"$set": data}, upsert=True)
+        write_behind.queue_user_state(
+            st.session_state["username"],
+            # Copies, since the session keeps mutating its lists
+            user_collections=list(st.session_state.get("user_collections", [])),
+            pdf_history=[dict(pdf) for pdf in st.session_state.get("pdf_history", [])]
+        )
 
 
 def load_user_chats():
     """Load the logged-in user's chats + collections from MongoDB into session state."""
     if "username" in st.session_state:
         username = st.session_state["username"]
-        user_data = chats_col.find_one({"username": username})
+        db.migrate_legacy_chats(username)
+        user_data = db.get_user_chats(username)
+        # Messages are loaded a page at a time when a PDF's chat is opened
+        st.session_state["chat_has_more"] = {}
         if user_data:
-            st.session_state["pdf_chats"] = user_data.get("pdf_chats", {})
+            st.session_state["pdf_chats"] = {}
             st.session_state["user_collections"] = user_data.get("user_collections", [])
             st.session_state["pdf_history"] = user_data.get("pdf_history", [])
             # Restore selected_pdf and current_collection if possible
@@ -59,6 +57,39 @@ def load_user_chats():
         st.session_state["current_collection"] = None
 
 
+def ensure_chat_loaded(pdf_name):
+    """Load the latest page of a PDF's chat into session state, once per session."""
+    if pdf_name in st.session_state.setdefault("pdf_chats", {}):
+        return
+    username = st.session_state.get("username")
+    if username:
+        # Another session of this user may still have buffered messages
+        write_behind.flush(username)
+    messages, has_more = db.get_messages(username, pdf_name) if username else ([], False)
+    st.session_state.pdf_chats[pdf_name] = messages
+    st.session_state.setdefault("chat_has_more", {})[pdf_name] = has_more
+
+
+def load_earlier_messages(pdf_name):
+    """Prepend the page of messages that precedes the oldest one shown."""
+    chats = st.session_state.pdf_chats.get(pdf_name, [])
+    oldest = next((c for c in chats if "_id" in c), None)
+    if oldest is None:
+        return
+    messages, has_more = db.get_messages(st.session_state["username"], pdf_name, before=oldest)
+    st.session_state.pdf_chats[pdf_name] = messages + chats
+    st.session_state.chat_has_more[pdf_name] = has_more
+
+
+def get_index_collection(user_collection_name):
+    """Qdrant collection backing a user's PDF (shared when deduplicated, else the legacy per-user name)."""
+    return next(
+        (pdf["index"] for pdf in st.session_state.get("pdf_history", [])
+         if pdf.get("collection") == user_collection_name and pdf.get("index")),
+        user_collection_name
+    )
+
+
 def img_to_base64(path):
     with open(path, "rb") as f:
         data = f.read()
@@ -84,6 +115,8 @@ def render_main_ui(send_message):
         st.session_state.chat_started = False
 
     selected_pdf = st.session_state.get("selected_pdf")
+    if selected_pdf:
+        ensure_chat_loaded(selected_pdf)
     pdf_chats = st.session_state.pdf_chats.get(selected_pdf, [])
 
     # --- Clear chat button ---
@@ -92,8 +125,10 @@ def render_main_ui(send_message):
             # Clear in session_state
             if "pdf_chats" in st.session_state:
                 st.session_state.pdf_chats[selected_pdf] = []
-            # Persist the cleared chat to USER_CHATS
-            save_user_chats()
+            st.session_state.setdefault("chat_has_more", {})[selected_pdf] = False
+            # Delete the stored messages (and any still buffered)
+            write_behind.discard_pending(st.session_state["username"], selected_pdf)
+            db.delete_messages(st.session_state["username"], selected_pdf)
             st.success(f"Chat history for '{selected_pdf}' cleared!")
             st.rerun()
 
@@ -151,8 +186,7 @@ def show_before_message_ui(send_message, selected_pdf):
             return
         st.session_state.input_text = selected_suggestion
         st.session_state.chat_started = True
-        send_message()
-        save_user_chats()  # <-- Save after user input
+        send_message()  # stores the exchange as one message document
         st.rerun()
     elif user_input:
         if not selected_pdf:
@@ -160,8 +194,7 @@ def show_before_message_ui(send_message, selected_pdf):
             return
         st.session_state.input_text = user_input
         st.session_state.chat_started = True
-        send_message()
-        save_user_chats()  # <-- Save after user input
+        send_message()  # stores the exchange as one message document
         st.rerun()
 
 def show_main_chat_input(send_message, selected_pdf):
@@ -183,8 +216,7 @@ def show_main_chat_input(send_message, selected_pdf):
             st.error("Please select or upload a PDF before sending a message.")
             return
         st.session_state.input_text = user_input
-        send_message()
-        save_user_chats()  # <-- Save after user input
+        send_message()  # stores the exchange as one message document
 
 def setup_ui():
     st.set_page_config(
@@ -207,40 +239,162 @@ def setup_ui():
 # --- The rest of your original render_sidebar, render_chat, typewriter functions remain unchanged ---
 
 
+def _pdf_entry(user_collection_name):
+    return next((pdf for pdf in st.session_state.get('pdf_history', [])
+                 if pdf.get('collection') == user_collection_name), None)
+
+
+def get_pending_ingest_job(user_collection_name):
+    """The still-running ingestion job for a user's PDF, if any."""
+    entry = _pdf_entry(user_collection_name)
+    if not entry or not entry.get("job_id"):
+        return None
+    from jobs import get_job, ACTIVE_STATES
+    job = get_job(entry["job_id"])
+    return job if job and job.get("state") in ACTIVE_STATES else None
+
+
+def _reindex_revised_pdf(username, user_collection_name, pdf_bytes, fingerprint, entry):
+    """
+    Re-index a revised PDF uploaded under an existing name.
+    Returns the Qdrant collection now backing the PDF and the ingestion job id
+    (None when nothing needs embedding).
+    - Revised bytes already indexed (by anyone) → just switch references.
+    - Index owned only by this user (or legacy) → upsert/delete only the changed chunks.
+    - Index shared with other users → leave theirs alone and build a new one.
+    """
+    from embeddings_utils import drop_index
+    from doc_registry import get_document, acquire_document, release_document
+    from ingest_jobs import submit_ingest_job
+    old_fingerprint = entry.get("fingerprint") if entry else None
+    old_doc = get_document(old_fingerprint)
+    new_doc = get_document(fingerprint)
+
+    if new_doc and new_doc.get("status") == "ready":
+        collection_to_drop = release_document(user_collection_name)
+        if collection_to_drop:
+            drop_index(collection_to_drop)
+        index_collection, _ = acquire_document(fingerprint, user_collection_name)
+        return index_collection, None
+
+    if old_doc is None or old_doc.get("refs") == [user_collection_name]:
+        index_collection = get_index_collection(user_collection_name)
+        job_id = submit_ingest_job(username, user_collection_name, index_collection, pdf_bytes, fingerprint,
+                                   incremental=True, old_fingerprint=old_fingerprint)
+        return index_collection, job_id
+
+    # The other references may have gone meanwhile, leaving this one the last
+    collection_to_drop = release_document(user_collection_name)
+    if collection_to_drop:
+        drop_index(collection_to_drop)
+    index_collection, needs_index = acquire_document(fingerprint, user_collection_name)
+    job_id = None
+    if needs_index:
+        job_id = submit_ingest_job(username, user_collection_name, index_collection, pdf_bytes, fingerprint)
+    return index_collection, job_id
+
+
+def _activate_pdf(pdf_name, user_collection_name, job_id):
+    """Select an uploaded PDF; its index is loaded now, or by app.py once its job finishes."""
+    st.session_state.selected_pdf = pdf_name
+    st.session_state.current_collection = user_collection_name
+    st.session_state.PDF_NAME = user_collection_name
+    st.session_state.vectordb = None
+    st.session_state.retriever = None
+    if job_id is None:
+        from embeddings_utils import build_or_load_index
+        vectordb = build_or_load_index(collection_name=get_index_collection(user_collection_name))
+        if vectordb is not None:
+            from embeddings_utils import get_retriever
+            st.session_state.vectordb = vectordb
+            st.session_state.retriever = get_retriever(vectordb, get_index_collection(user_collection_name))
+    else:
+        st.session_state.setdefault("watched_jobs", []).append(job_id)
+
+
+@st.fragment(run_every=2)
+def render_ingest_status():
+    """Poll background ingestion jobs for this user's uploads."""
+    from jobs import get_job, list_jobs, ACTIVE_STATES
+    if "watched_jobs" not in st.session_state:
+        # New session (refresh or re-login): pick up jobs that kept running meanwhile
+        username = st.session_state.get("username", "guest")
+        st.session_state["watched_jobs"] = [job["_id"] for job in list_jobs(username, kind="ingest", active_only=True)]
+    watched = st.session_state["watched_jobs"]
+    if not watched:
+        return
+    still_running = []
+    finished = False
+    for job_id in watched:
+        job = get_job(job_id)
+        if job is None:
+            continue
+        name = job["params"]["ref"].split("__", 1)[-1]
+        if job["state"] in ACTIVE_STATES:
+            still_running.append(job_id)
+            progress = job.get("progress") or {}
+            done, total = progress.get("done") or 0, progress.get("total")
+            label = f"Indexing '{name}'... page {done}/{total}" if total else f"Indexing '{name}' (queued)..."
+            st.progress(min(done / total, 1.0) if total else 0.0, text=label)
+        elif job["state"] == "done":
+            finished = True
+            st.toast(f"'{name}' indexed!", icon="✅")
+        else:
+            finished = True
+            st.error(f"Indexing '{name}' failed: {job.get('error')}")
+    st.session_state["watched_jobs"] = still_running
+    if finished and not still_running:
+        # Let app.py load the finished index for the selected PDF
+        st.session_state.vectordb = None
+        st.rerun(scope="app")
+
+
+@st.fragment(run_every=2)
+def render_delete_status():
+    """Poll background deletion jobs; a failed one can be retried from where it stopped."""
+    from jobs import get_job, list_jobs, retry_job, ACTIVE_STATES
+    if "watched_deletes" not in st.session_state:
+        # New session: pick up deletions still running, and failed ones awaiting a retry
+        username = st.session_state.get("username", "guest")
+        st.session_state["watched_deletes"] = [job["_id"] for job in list_jobs(username, kind="delete")
+                                               if job["state"] != "done"]
+    still_watched = []
+    for job_id in st.session_state["watched_deletes"]:
+        job = get_job(job_id)
+        if job is None:
+            continue
+        name = job["params"].get("pdf_name") or "your account"
+        if job["state"] in ACTIVE_STATES:
+            still_watched.append(job_id)
+            progress = job.get("progress") or {}
+            done, total = progress.get("done") or 0, progress.get("total")
+            st.progress(min(done / total, 1.0) if total else 0.0, text=f"Deleting '{name}'...")
+        elif job["state"] == "done":
+            st.toast(f"'{name}' deleted!", icon="🗑")
+        else:
+            still_watched.append(job_id)
+            st.error(f"Deleting '{name}' failed: {job.get('error')}")
+            if st.button("Retry", key=f"retry_{job_id}"):
+                retry_job(job_id)
+    st.session_state["watched_deletes"] = still_watched
+
+
 def render_sidebar():
     username = st.session_state.get("username", "guest")
-    # Ensure MongoDB collection handle is always available
-    from pymongo import MongoClient
-    from config import MONGO_URI
-    client = MongoClient(MONGO_URI)
-    db = client["pdfbot"]
-    chats_col = db["users"]
-    creds_ok = False
-    drive_service = None
-    # Check for Google Drive credentials
-    if "google_creds" in st.session_state:
-        creds_ok = True
-    else:
-        # Try to load from MongoDB
-        from pymongo import MongoClient
-        from config import MONGO_URI
-        client = MongoClient(MONGO_URI)
-        db = client["pdfbot"]
-        chats_col = db["users"]
-        user_data = chats_col.find_one({"username": username})
-        if user_data and user_data.get("google_creds"):
-            st.session_state["google_creds"] = user_data["google_creds"]
-            creds_ok = True
-    if creds_ok:
+    storage = get_storage()
+    # Drive needs the user's Google credentials; local and in-memory storage are always ready
+    storage_ok = storage.is_connected(username)
+    if storage_ok and storage.requires_oauth:
         try:
-            drive_service = get_drive_service()
+            from gdrive_utils import get_drive_service
+            get_drive_service()
         except Exception as e:
             st.error(f"Google Drive authentication failed: {e}. Please reconnect.")
-            creds_ok = False
+            storage_ok = False
 
     with st.sidebar:
         st.markdown("### 📄 Upload a PDF")
-        if not creds_ok:
+        if not storage_ok:
             st.warning("Google Drive not connected. Please connect to upload/download files.")
             # Show only the Connect to Google Drive link
             import json
@@ -253,24 +407,69 @@ def render_sidebar():
         else:
             uploaded_pdf = st.file_uploader("Choose a PDF file", type=["pdf"], key="pdf_uploader")
             upload_clicked = st.button("Upload", key="upload_pdf_button")
-            if uploaded_pdf and upload_clicked:
+            from delete_jobs import get_pending_pdf_delete
+            if uploaded_pdf and upload_clicked and get_pending_pdf_delete(username, uploaded_pdf.name):
+                # The pending job would otherwise race the new upload's registration and history
+                st.warning(f"'{uploaded_pdf.name}' is still being deleted; please upload it again in a moment.")
+            elif uploaded_pdf and upload_clicked:
                 pdf_name = uploaded_pdf.name
-                pdf_bytes = uploaded_pdf.read()
-                # Upload to Google Drive in user's folder (will reuse if exists)
-                drive_result = upload_pdf_to_drive(drive_service, pdf_name, pdf_bytes, username=username)
+                pdf_bytes = uploaded_pdf.getvalue()
+                # Store in the user's folder (reused if the name exists); Drive streams the
+                # upload buffer in resumable chunks
+                store_label = "Drive" if storage.name == "drive" else "storage"
+                upload_bar = st.progress(0.0, text=f"Uploading {pdf_name} to {store_label}...")
+
+                def on_upload_progress(fraction):
+                    upload_bar.progress(fraction, text=f"Uploading {pdf_name} to {store_label}... {fraction:.0%}")
+
+                drive_result = storage.put(username, pdf_name, uploaded_pdf, on_progress=on_upload_progress)
+                upload_bar.progress(1.0, text=f"{pdf_name} is in {store_label}")
                 file_id = drive_result["id"]
                 webViewLink = drive_result["webViewLink"]
 
                 user_collection_name = f"{username}__{pdf_name}"
+                from doc_registry import fingerprint_pdf, acquire_document
+                from ingest_jobs import submit_ingest_job
+                fingerprint = fingerprint_pdf(pdf_bytes)
                 # Check if this PDF already exists in user_collections
                 if user_collection_name in st.session_state.get('user_collections', []):
-                    # Reuse existing chat interface and collection
-                    st.session_state.selected_pdf = pdf_name
-                    st.session_state.current_collection = user_collection_name
-        
-                    st.success(f"PDF '{pdf_name}' already exists. Reusing previous chat and collection.", icon="✅")
-                    st.rerun()
+                    entry = _pdf_entry(user_collection_name)
+                    if entry and entry.get("fingerprint") == fingerprint:
+                        # Same content: reuse existing chat interface and collection
+                        st.session_state.selected_pdf = pdf_name
+                        st.session_state.current_collection = user_collection_name
+
+                        st.success(f"PDF '{pdf_name}' already exists. Reusing previous chat and collection.", icon="✅")
+                        st.rerun()
+
+                    # Revised content under the same name: keep storage and the index in step
+                    storage.replace(username, file_id, uploaded_pdf, on_progress=on_upload_progress)
+                    index_collection, job_id = _reindex_revised_pdf(username, user_collection_name, pdf_bytes, fingerprint, entry)
+                    if entry:
+                        entry.update({"file_id": file_id, "fingerprint": fingerprint, "index": index_collection, "job_id": job_id})
+                    else:
+                        st.session_state.setdefault('pdf_history', []).append({
+                            "name": pdf_name,
+                            "file_id": file_id,
+                            "webViewLink": webViewLink,
+                            "collection": user_collection_name,
+                            "fingerprint": fingerprint,
+                            "index": index_collection,
+                            "job_id": job_id
+                        })
+                    _activate_pdf(pdf_name, user_collection_name, job_id)
+                    save_user_chats()
+                    st.success(f"PDF '{pdf_name}' updated; only changed pages are being re-indexed.", icon="✅")
                 else:
+                    # Identical PDFs (from any user) share one refcounted Qdrant index;
+                    # only the first upload is embedded, in the background
+                    index_collection, needs_index = acquire_document(fingerprint, user_collection_name)
+                    job_id = None
+                    if needs_index:
+                        job_id = submit_ingest_job(username, user_collection_name, index_collection, pdf_bytes, fingerprint)
+                    else:
+                        print(f"[DEBUG] Reusing shared index {index_collection} for {user_collection_name}")
+
                     # Store file_id in pdf_history and user_collections
                     if 'pdf_history' not in st.session_state:
                         st.session_state['pdf_history'] = []
@@ -278,97 +477,27 @@ def render_sidebar():
                         "name": pdf_name,
                         "file_id": file_id,
                         "webViewLink": webViewLink,
-                        "collection": user_collection_name
+                        "collection": user_collection_name,
+                        "fingerprint": fingerprint,
+                        "index": index_collection,
+                        "job_id": job_id
                     })
                     if 'user_collections' not in st.session_state:
                         st.session_state['user_collections'] = []
                     if user_collection_name not in st.session_state['user_collections']:
                         st.session_state['user_collections'].append(user_collection_name)
 
-                    # Build embeddings/index for this user's collection using in-memory bytes
-                    from embeddings_utils import build_or_load_index
-                    import tempfile
-                    import os
-                    # Only build embeddings if not already present for this collection
-                    if (
-                        "vectordb" not in st.session_state
-                        or st.session_state.vectordb is None
-                        or st.session_state.PDF_NAME != user_collection_name
-                    ):
-                        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-                            tmp.write(pdf_bytes)
-                            tmp.flush()
-                            temp_pdf_path = tmp.name
-                        try:
-                            vectordb = build_or_load_index(collection_name=user_collection_name, pdf_path=temp_pdf_path)
-                            if vectordb is None:
-                                st.error("Failed to build or load PDF index. Please check your PDF and try again.")
-                                return
-                            st.session_state.vectordb = vectordb
-                            st.session_state.retriever = vectordb.as_retriever(search_kwargs={"k": 4})
-                            st.session_state.PDF_NAME = user_collection_name
-                        finally:
-                            try:
-                                os.remove(temp_pdf_path)
-                            except Exception as e:
-                                print(f"[WARNING] Could not delete temp PDF file: {e}")
-
-                    st.session_state.selected_pdf = pdf_name
-                    st.session_state.current_collection = user_collection_name
+                    _activate_pdf(pdf_name, user_collection_name, job_id)
                     if 'pdf_chats' not in st.session_state:
                         st.session_state['pdf_chats'] = {}
                     st.session_state.pdf_chats[pdf_name] = []
                     save_user_chats()
-                    st.success(f"PDF '{pdf_name}' uploaded to Drive and indexed!", icon="✅")
-                if 'pdf_history' not in st.session_state:
-                    st.session_state['pdf_history'] = []
-                st.session_state['pdf_history'].append({
-                    "name": pdf_name,
-                    "file_id": file_id,
-                    "webViewLink": webViewLink,
-                    "collection": user_collection_name
-                })
-                if 'user_collections' not in st.session_state:
-                    st.session_state['user_collections'] = []
-                if user_collection_name not in st.session_state['user_collections']:
-                    st.session_state['user_collections'].append(user_collection_name)
-
-                # Build embeddings/index for this user's collection using in-memory bytes
-                from embeddings_utils import build_or_load_index
-                import tempfile
-                import os
-                # Only build embeddings if not already present for this collection
-                if (
-                    "vectordb" not in st.session_state
-                    or st.session_state.vectordb is None
-                    or st.session_state.PDF_NAME != user_collection_name
-                ):
-                    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-                        tmp.write(pdf_bytes)
-                        tmp.flush()
-                        temp_pdf_path = tmp.name
-                    try:
-                        vectordb = build_or_load_index(collection_name=user_collection_name, pdf_path=temp_pdf_path)
-                        if vectordb is None:
-                            st.error("Failed to build or load PDF index. Please check your PDF and try again.")
-                            return
-                        st.session_state.vectordb = vectordb
-                        st.session_state.retriever = vectordb.as_retriever(search_kwargs={"k": 4})
-                        st.session_state.PDF_NAME = user_collection_name
-                    finally:
-                        try:
-                            os.remove(temp_pdf_path)
-                        except Exception as e:
-                            print(f"[WARNING] Could not delete temp PDF file: {e}")
-
-                st.session_state.selected_pdf = pdf_name
-                st.session_state.current_collection = user_collection_name
-                if 'pdf_chats' not in st.session_state:
-                    st.session_state['pdf_chats'] = {}
-                st.session_state.pdf_chats[pdf_name] = []
-                save_user_chats()
-                st.success(f"PDF '{pdf_name}' uploaded to Drive and indexed!", icon="✅")
-
+                    if job_id:
+                        st.success(f"PDF '{pdf_name}' uploaded to {store_label}; indexing in the background.", icon="✅")
+                    else:
+                        st.success(f"PDF '{pdf_name}' uploaded to {store_label} and indexed!", icon="✅")
+        render_ingest_status()
+        render_delete_status()
         # --- Sidebar PDF list ---
         pdf_names = [
             col.split("__", 1)[1]
@@ -392,17 +521,18 @@ def render_sidebar():
                         if st.button(pdf_name, key=f"select_{pdf_name}"):
                             if user_collection_name:
                                 st.session_state.current_collection = user_collection_name
-                                from embeddings_utils import build_or_load_index
-                                st.session_state.vectordb = build_or_load_index(collection_name=user_collection_name)
-                                st.session_state.retriever = st.session_state.vectordb.as_retriever(search_kwargs={"k": 4})
-
-                            if 'pdf_chats' not in st.session_state:
-                                st.session_state['pdf_chats'] = {}
-                            if pdf_name not in st.session_state.pdf_chats:
-                                # try to restore from persisted MongoDB if available
-                                user_data = chats_col.find_one({"username": username})
-                                restored_chats = user_data.get("pdf_chats", {}).get(pdf_name, []) if user_data else []
-                                st.session_state.pdf_chats[pdf_name] = restored_chats if restored_chats is not None else []
+                                pending_job = get_pending_ingest_job(user_collection_name)
+                                if pending_job:
+                                    st.session_state.vectordb = None
+                                    st.session_state.retriever = None
+                                else:
+                                    from embeddings_utils import build_or_load_index, get_retriever
+                                    index_collection = get_index_collection(user_collection_name)
+                                    st.session_state.vectordb = build_or_load_index(collection_name=index_collection)
+                                    st.session_state.retriever = get_retriever(st.session_state.vectordb, index_collection)
+
+                            # Restore the latest page of this PDF's chat from MongoDB
+                            ensure_chat_loaded(pdf_name)
 
                             st.session_state.selected_pdf = pdf_name
                             # Persist selection so reload preserves the correct chat mapping
@@ -411,39 +541,11 @@ def render_sidebar():
 
                 with col2:
                     if st.button("🗑️", key=f"remove_{user_collection_name}_{pdf_name}_{i}"):
-                        from qdrant_client import QdrantClient
-                        from config import QDRANT_URL, QDRANT_API_KEY
-
-                        # Delete Qdrant collection
-                        if user_collection_name:
-                            try:
-                                qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-                                collections = qdrant.get_collections().collections
-                                collection_names = [c.name for c in collections]
-                                if user_collection_name in collection_names:
-                                    qdrant.delete_collection(collection_name=user_collection_name)
-                                    import time as _time
-                                    for _ in range(5):
-                                        collections = qdrant.get_collections().collections
-                                        collection_names = [c.name for c in collections]
-                                        if user_collection_name not in collection_names:
-                                            break
-                                        _time.sleep(0.5)
-                            except Exception as e:
-                                print(f"[ERROR] Failed to delete Qdrant collection '{user_collection_name}': {e}")
-
-                        # Delete PDF from Google Drive
-                        file_id = next(
-                            (pdf['file_id'] for pdf in st.session_state.get('pdf_history', [])
+                        entry = next(
+                            (pdf for pdf in st.session_state.get('pdf_history', [])
                              if pdf['name'] == pdf_name and pdf.get('collection') == user_collection_name),
-                            None
+                            {}
                         )
-                        if file_id:
-                            try:
-                                from gdrive_utils import delete_pdf_from_drive
-                                delete_pdf_from_drive(drive_service, file_id, username=username)
-                            except Exception as e:
-                                print(f"[ERROR] Failed to delete PDF from Drive: {e}")
 
                         # Remove from user_collections
                         if user_collection_name in st.session_state.get('user_collections', []):
@@ -459,23 +561,18 @@ def render_sidebar():
                             if not (pdf['name'] == pdf_name and pdf.get('collection') == user_collection_name)
                         ]
 
-                        # Remove from MongoDB for this user
-                        user_data = chats_col.find_one({"username": username})
-                        if user_data:
-                            pdf_chats = user_data.get("pdf_chats", {})
-                            pdf_chats.pop(pdf_name, None)
-                            user_collections = user_data.get("user_collections", [])
-                            user_collections = [col for col in user_collections if col != user_collection_name]
-                            pdf_history = user_data.get("pdf_history", [])
-                            pdf_history = [pdf for pdf in pdf_history if not (pdf['name'] == pdf_name and pdf.get('collection') == user_collection_name)]
-                            chats_col.update_one(
-                                {"username": username},
-                                {"$set": {"pdf_chats": pdf_chats, "user_collections": user_collections, "pdf_history": pdf_history}}
-                            )
+                        # The index reference, stored file, messages and MongoDB state are
+                        # deleted by a background job; the queued state already omits this PDF.
+                        # Entries without a collection still have a file and a history row.
+                        from delete_jobs import submit_pdf_delete_job
+                        job_id = submit_pdf_delete_job(username, pdf_name, user_collection_name,
+                                                       entry.get('file_id'), entry.get('fingerprint'))
+                        st.session_state.setdefault("watched_deletes", []).append(job_id)
+                        save_user_chats()
 
                         if st.session_state.get("selected_pdf") == pdf_name:
                             st.session_state["selected_pdf"] = None
-                        st.success("🗑 PDF deleted!")
+                        st.toast(f"Deleting '{pdf_name}' in the background...", icon="🗑")
                         st.rerun()
         else:
             st.info("No PDFs uploaded or indexed yet.")
@@ -504,6 +601,29 @@ def typewriter(text, delay=0.005):
     return displayed_text
 
 
+def render_pdf_download(pdf_name, file_id):
+    """
+    Download widget for a PDF. Nothing is fetched until the user asks; after that
+    the bytes come from the local download cache and are served by Streamlit's
+    media endpoint rather than inlined into the page.
+    """
+    requested = st.session_state.setdefault("pdf_downloads", set())
+    if file_id not in requested:
+        if st.button(f"⬇️ Get {pdf_name}", key=f"prepare_download_{file_id}"):
+            requested.add(file_id)
+            st.rerun()
+        return
+    try:
+        # Streamlit's media store needs bytes; Drive serves them from the local blob cache
+        pdf_data = get_storage().get(st.session_state.get("username", "guest"), file_id)
+    except Exception as e:
+        requested.discard(file_id)
+        st.error(f"⚠️ Sorry, the PDF {pdf_name} could not be downloaded: {e}")
+        return
+    st.download_button(f"⬇️ Download {pdf_name}", data=pdf_data, file_name=pdf_name,
+                       mime="application/pdf", key=f"download_{file_id}")
+
+
 def render_chat():
     print("[DEBUG] render_chat called")
 
@@ -563,18 +683,36 @@ def render_chat():
     if not selected_pdf:
         st.warning("⚠️ Please upload or select a PDF to start chatting.")
         return
-    if selected_pdf not in st.session_state.pdf_chats:
-        st.session_state.pdf_chats[selected_pdf] = []
+    ensure_chat_loaded(selected_pdf)
+    if st.session_state.get("chat_has_more", {}).get(selected_pdf):
+        if st.button("⬆️ Load earlier messages", key=f"load_earlier_{selected_pdf}"):
+            load_earlier_messages(selected_pdf)
+            st.rerun()
 
     st.markdown("<div class='chat-container'>", unsafe_allow_html=True)
     chats = st.session_state.pdf_chats[selected_pdf]
-    # Find the Google Drive file ID for the selected PDF
+    # Find the stored file ID for the selected PDF
     user_collection_name = st.session_state.get('current_collection')
     file_id = None
     if user_collection_name:
         file_id = next((pdf['file_id'] for pdf in st.session_state.get('pdf_history', [])
                         if pdf['name'] == selected_pdf and pdf.get('collection') == user_collection_name), None)
-    drive_service = get_drive_service()
+    download_commands = [
+        "⬇️ download pdf",
+        "download pdf",
+        "get pdf",
+        "Show pdf",
+        "send pdf",
+        "download file",
+        "get file",
+        "send file",
+        "pdf download",
+        "please download pdf",
+        "can i download pdf",
+        "download the pdf",
+    ]
+    last_download = max((i for i, chat in enumerate(chats)
+                         if chat['user'].strip().lower() in download_commands), default=None)
     for i, chat in enumerate(chats):
         # User message
         st.markdown(
@@ -589,31 +727,11 @@ def render_chat():
 
         # Bot response
         bot_content = chat['bot']
-        download_commands = [
-            "⬇️ download pdf",
-            "download pdf",
-            "get pdf",
-            "Show pdf",
-            "send pdf",
-            "download file",
-            "get file",
-            "send file",
-            "pdf download",
-            "please download pdf",
-            "can i download pdf",
-            "download the pdf",
-        ]
 
         if chat['user'].strip().lower() in download_commands:
             if file_id:
-                from gdrive_utils import download_pdf_from_drive
-                username = st.session_state.get("username", "guest")
-                try:
-                    pdf_bytes = download_pdf_from_drive(drive_service, file_id, username=username)
-                    b64_pdf = base64.b64encode(pdf_bytes).decode()
-                    bot_content = f"Here is your PDF: <a href='data:application/pdf;base64,{b64_pdf}' download='{selected_pdf}' style='text-decoration:none; font-weight:bold;'>⬇️ {selected_pdf}</a>"
-                except Exception as e:
-                    bot_content = f"⚠️ Sorry, the PDF <b>{selected_pdf}</b> could not be downloaded: {e}"
+                # No bytes in the page: the widget under the latest request fetches them on click
+                bot_content = f"Here is your PDF: <b>⬇️ {selected_pdf}</b>"
             else:
                 bot_content = f"⚠️ Sorry, the PDF <b>{selected_pdf}</b> is not available for download."
 
@@ -628,6 +746,8 @@ def render_chat():
                 """,
                 unsafe_allow_html=True,
             )
+            if file_id and i == last_download:
+                render_pdf_download(selected_pdf, file_id)
 
         elif i == len(chats) - 1 and not chat.get("animated", False):
             # Show 'Bot is thinking...' interface before typewriter effect
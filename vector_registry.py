@@ -0,0 +1,77 @@
+# vector_registry.py
+import time
+import threading
+from collections import OrderedDict
+from qdrant_client import QdrantClient
+from config import QDRANT_URL, QDRANT_API_KEY, VECTOR_STORE_CACHE_SIZE, VECTOR_STORE_TTL_SECONDS
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_qdrant_client():
+    """
+    Process-wide Qdrant client. It keeps one pooled HTTP connection for every
+    session and job thread instead of a new handshake per load.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        return _client
+
+
+class HandleRegistry:
+    """
+    Thread-safe LRU map of shared handles. An entry is evicted once there are more
+    than max_entries, or when it has not been used for ttl_seconds.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (handle, last_used)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries[key] = (entry[0], time.monotonic())
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, handle):
+        with self.lock:
+            self.entries[key] = (handle, time.monotonic())
+            self.entries.move_to_end(key)
+            self._evict()
+        return handle
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (_, used) in self.entries.items() if now - used > self.ttl]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+# Loaded vector stores keyed by index name, shared by every session in the process
+vector_stores = HandleRegistry(VECTOR_STORE_CACHE_SIZE, VECTOR_STORE_TTL_SECONDS)
+# Query-time search params per Qdrant collection, wrapped in a 1-tuple (None is a valid
+# value), so building a retriever does not ask Qdrant for the collection's quantization
+search_settings = HandleRegistry(VECTOR_STORE_CACHE_SIZE, VECTOR_STORE_TTL_SECONDS)
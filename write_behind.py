@@ -0,0 +1,136 @@
+# write_behind.py
+import atexit
+import threading
+import traceback
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import db
+from config import WRITE_BUFFER_FLUSH_SECONDS, WRITE_BUFFER_MAX_PENDING
+
+
+class WriteBehindBuffer:
+    """
+    Buffers chat messages and per-user state updates in memory and writes them to
+    MongoDB from a background thread: every flush_seconds, or as soon as
+    max_pending writes are waiting. State updates for the same user coalesce, so
+    only the latest field values are written.
+    """
+
+    def __init__(self, flush_seconds, max_pending):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.messages = []
+        self.states = {}  # username -> {field: value}
+        self.thread = None
+
+    def _start(self):
+        # Called with self.cond held
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def _pending(self):
+        return len(self.messages) + len(self.states)
+
+    def add_message(self, message):
+        with self.cond:
+            self._start()
+            self.messages.append(message)
+            if self._pending() >= self.max_pending:
+                self.cond.notify()
+
+    def set_state(self, username, **fields):
+        with self.cond:
+            self._start()
+            self.states.setdefault(username, {}).update(fields)
+            if self._pending() >= self.max_pending:
+                self.cond.notify()
+
+    def discard(self, username, pdf_name=None):
+        """
+        Drop pending messages (of one PDF, or all of a user's, with their state) before a
+        delete. Waits for an in-flight flush first, so nothing it swapped out lands afterwards.
+        """
+        with self.flush_lock, self.cond:
+            self.messages = [m for m in self.messages
+                             if not (m["username"] == username and pdf_name in (None, m["pdf_name"]))]
+            if pdf_name is None:
+                self.states.pop(username, None)
+
+    def has_pending(self, username):
+        with self.cond:
+            return username in self.states or any(m["username"] == username for m in self.messages)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self._pending() >= self.max_pending, timeout=self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    def flush(self):
+        """Write everything pending now. Failed writes are put back for the next flush."""
+        with self.flush_lock:
+            with self.cond:
+                messages, self.messages = self.messages, []
+                states, self.states = self.states, {}
+            if not messages and not states:
+                return
+            try:
+                if messages:
+                    try:
+                        db.messages_collection().insert_many(messages, ordered=False)
+                    except BulkWriteError as e:
+                        # Duplicate _ids are messages a previous, partly failed flush already wrote
+                        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                            raise
+                    messages = []
+                if states:
+                    # No upsert: state for a user deleted meanwhile must not re-create the document
+                    db.users_collection().bulk_write(
+                        [UpdateOne({"username": u}, {"$set": fields}) for u, fields in states.items()],
+                        ordered=False,
+                    )
+            except Exception:
+                with self.cond:
+                    self.messages = messages + self.messages
+                    for username, fields in states.items():
+                        # Newer values queued meanwhile win over the failed ones
+                        self.states[username] = {**fields, **self.states.get(username, {})}
+                raise
+
+
+# Process-wide buffer shared by every session
+_buffer = WriteBehindBuffer(WRITE_BUFFER_FLUSH_SECONDS, WRITE_BUFFER_MAX_PENDING)
+
+
+def queue_message(username, pdf_name, user, bot):
+    """
+    Record a chat exchange without waiting for MongoDB. The _id is assigned here,
+    so the returned message can already serve as a pagination cursor.
+    """
+    message = {"_id": ObjectId(), "username": username, "pdf_name": pdf_name,
+               "ts": datetime.now(timezone.utc), "user": user, "bot": bot}
+    _buffer.add_message(message)
+    return message
+
+
+def queue_user_state(username, **fields):
+    _buffer.set_state(username, **fields)
+
+
+def discard_pending(username, pdf_name=None):
+    _buffer.discard(username, pdf_name)
+
+
+def flush(username=None):
+    """Write pending updates synchronously; with a username, only if that user has any."""
+    if username is None or _buffer.has_pending(username):
+        _buffer.flush()